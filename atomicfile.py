@@ -0,0 +1,27 @@
+import os
+import tempfile
+
+
+""" writes text to path, creating its directory, so that readers never
+    see a partial file, also when several processes write the same path """
+
+
+def writeAtomic(path, text):
+    d = os.path.dirname(os.path.abspath(path))
+    try:
+        os.makedirs(d)
+    except OSError:
+        if not os.path.isdir(d):
+            raise
+
+    fd, tmp = tempfile.mkstemp(dir=d, prefix=".tmp")
+    f = os.fdopen(fd, "w")
+    f.write(text)
+    f.close()
+
+    # mkstemp creates the file readable by its owner only
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(tmp, 0666 & ~umask)
+
+    os.rename(tmp, path)
@@ -0,0 +1,259 @@
+""" Columnar EDBs: the facts of each relation held as one array of integers
+    per argument, loaded from delimited files row by row, so that large
+    relation dumps need no Python object per tuple.
+
+    Constants are interned in a SymbolTable and numbered 1, 2, ... in the
+    order they are first seen (0 is not part of the encoding's domain).
+    Files ending in .tsv are tab separated, all others comma separated;
+    each row is one tuple, blank rows and rows starting with # are skipped.
+"""
+
+from array import array
+from bisect import bisect_left
+import csv
+
+from silp import EDB, Fact
+
+
+# packed keys are stored as C longs
+MAX_KEY = 2 ** 63
+
+
+class SymbolTable(object):
+    """ constants of a task and their integer codes """
+
+    def __init__(self):
+        self.ids = {}
+        self.names = [None]
+
+    def intern(self, s):
+        s = str(s).strip()
+        i = self.ids.get(s)
+        if i is None:
+            i = len(self.names)
+            self.ids[s] = i
+            self.names.append(s)
+        return i
+
+    def name(self, i):
+        return self.names[i]
+
+    def __len__(self):
+        return len(self.names) - 1
+
+
+class Columns(object):
+    """ tuples of one relation, column by column; once frozen they are
+        sorted and distinct, and membership is a binary search over
+        their packed keys (a set of tuples when keys do not fit a long).
+        Joins look rows up by the values at some argument positions, as
+        in datalog.Table, by bisecting row numbers sorted on those
+        positions """
+
+    def __init__(self, arity):
+        self.arity = arity
+        self.n = 0
+        self.cols = [array('l') for i in range(arity)]
+        self.keys = None
+        self.radix = None
+        self.indexes = {}
+
+    def append(self, t):
+        assert(len(t) == self.arity)
+        for (c, v) in zip(self.cols, t):
+            c.append(v)
+        self.n = self.n + 1
+
+    def pack(self, t):
+        k = 0
+        for v in t:
+            k = k * self.radix + v
+        return k
+
+    """ sorts the tuples and drops repeated ones; codes are below radix """
+
+    def freeze(self, radix):
+        self.radix = radix
+        self.indexes = {}
+        if radix ** self.arity >= MAX_KEY:
+            self.keys = set(self)
+            rows = sorted(self.keys)
+        else:
+            packed = array('l', (self.pack(t) for t in self))
+            self.cols = None
+            keys = array('l')
+            for k in sorted(packed):
+                if len(keys) == 0 or keys[-1] != k:
+                    keys.append(k)
+            del packed
+            self.keys = keys
+            rows = (self.unpack(k) for k in self.keys)
+
+        cols = [array('l') for i in range(self.arity)]
+        for t in rows:
+            for (c, v) in zip(cols, t):
+                c.append(v)
+        self.cols = cols
+        self.n = len(self.keys)
+
+    def unpack(self, k):
+        t = []
+        for i in range(0, self.arity):
+            t.append(k % self.radix)
+            k = k // self.radix
+        return reversed(t)
+
+    def __len__(self):
+        return self.n
+
+    def row(self, j):
+        return tuple(c[j] for c in self.cols)
+
+    def __iter__(self):
+        for j in xrange(0, self.n):
+            yield self.row(j)
+
+    """ row numbers ordered by their arguments at positions pos; None
+        when pos is a prefix, as frozen rows are already in that order """
+
+    def order(self, pos):
+        if pos == tuple(range(0, len(pos))):
+            return None
+
+        if pos not in self.indexes:
+            cols = [self.cols[p] for p in pos]
+            self.indexes[pos] = array('l', sorted(
+                xrange(0, self.n), key=lambda j: tuple(c[j] for c in cols)))
+        return self.indexes[pos]
+
+    """ all tuples whose arguments at positions pos equal key """
+
+    def lookup(self, pos, key):
+        if pos == ():
+            return self
+        assert(self.keys is not None)
+
+        key = tuple(key)
+        if pos == tuple(range(0, self.arity)):
+            return [key] if key in self else []
+
+        rows = self.order(pos)
+        cols = [self.cols[p] for p in pos]
+
+        def at(i):
+            j = i if rows is None else rows[i]
+            return tuple(c[j] for c in cols)
+
+        # first row not below key
+        (lo, hi) = (0, self.n)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+        ts = []
+        while lo < self.n and at(lo) == key:
+            ts.append(self.row(lo if rows is None else rows[lo]))
+            lo = lo + 1
+        return ts
+
+    def __contains__(self, t):
+        assert(self.keys is not None)
+        if isinstance(self.keys, set):
+            return tuple(t) in self.keys
+        if len(t) != self.arity:
+            return False
+        if not all(isinstance(v, (int, long)) and 0 <= v < self.radix for v in t):
+            return False
+
+        k = self.pack(t)
+        j = bisect_left(self.keys, k)
+        return j < len(self.keys) and self.keys[j] == k
+
+
+class FactView(object):
+    """ the facts of a columnar EDB, made one at a time """
+
+    def __init__(self, edb):
+        self.edb = edb
+
+    def __iter__(self):
+        for r in self.edb.irels:
+            for t in self.edb.rtuples[r]:
+                yield Fact(r, *t)
+
+    def __len__(self):
+        return sum(map(len, self.edb.rtuples.values()))
+
+    def __repr__(self):
+        return str(list(self))
+
+
+class ColumnarEDB(EDB):
+    """ EDB whose relations are Columns over the codes of symbols """
+
+    def __init__(self, irels, columns, symbols):
+        self.irels = irels
+
+        # check no repeated decl of same relation
+        assert(len(set(irels)) == len(irels))
+        assert(set(columns.keys()) == set(irels))
+
+        self.rtuples = columns
+        self.symbols = symbols
+        self.facts = FactView(self)
+
+    """ (relation, tuple) of every fact, relation by relation """
+
+    def pairs(self):
+        for r in self.irels:
+            for t in self.rtuples[r]:
+                yield (r, t)
+
+
+""" appends the rows of the delimited file path to the Columns cols of
+    relation r, interning their constants in symbols """
+
+
+def loadRows(r, path, cols, symbols):
+    delim = "\t" if path.endswith(".tsv") else ","
+    with open(path, "rb") as f:
+        for n, row in enumerate(csv.reader(f, delimiter=delim)):
+            if row == [] or row[0].startswith("#"):
+                continue
+            if len(row) != r.arity:
+                raise ValueError("%s:%d: %d columns for %s of arity %d" %
+                                 (path, n + 1, len(row), r.name, r.arity))
+            cols.append(map(symbols.intern, row))
+
+
+""" builds the ColumnarEDB of relations irels from files, a dict from
+    relation name to a file or a list of files, and the facts given as
+    [relation name, constant, ...]; all constants go through symbols """
+
+
+def loadEdb(irels, files, facts, symbols):
+    columns = {}
+    for r in irels:
+        columns[r] = Columns(r.arity)
+
+    rels = dict(map(lambda r: (r.name, r), irels))
+    for (name, paths) in files.items():
+        if name not in rels:
+            raise ValueError("no EDB relation %s for %s" % (name, paths))
+        if isinstance(paths, basestring):
+            paths = [paths]
+        for path in paths:
+            loadRows(rels[name], path, columns[rels[name]], symbols)
+
+    for f in facts:
+        columns[rels[f[0]]].append(map(symbols.intern, f[1:]))
+
+    # codes are below len(symbols) + 1; constants interned later (e.g.
+    # by examples) are not in any relation anyway
+    for r in irels:
+        columns[r].freeze(len(symbols) + 1)
+
+    return ColumnarEDB(irels, columns, symbols)
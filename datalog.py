@@ -0,0 +1,203 @@
+from itertools import product
+
+
+class Table:
+    """ Set of tuples of one relation, with hash indexes on the
+        argument positions that joins have looked it up by """
+
+    def __init__(self):
+        self.tuples = set()
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.tuples)
+
+    def __contains__(self, t):
+        return t in self.tuples
+
+    def __iter__(self):
+        return iter(self.tuples)
+
+    def add(self, t):
+        if t in self.tuples:
+            return False
+
+        self.tuples.add(t)
+        for pos, index in self.indexes.items():
+            key = tuple([t[p] for p in pos])
+            index.setdefault(key, []).append(t)
+
+        return True
+
+    """ all tuples whose arguments at positions pos equal key """
+
+    def lookup(self, pos, key):
+        if pos == ():
+            return self.tuples
+
+        if pos not in self.indexes:
+            index = {}
+            for t in self.tuples:
+                k = tuple([t[p] for p in pos])
+                index.setdefault(k, []).append(t)
+            self.indexes[pos] = index
+
+        return self.indexes[pos].get(key, [])
+
+
+def isVar(a):
+    return isinstance(a, str)
+
+
+class Evaluator:
+    """ Semi-naive bottom-up evaluator computing the least model of
+        clauses over the facts of an EDB; consists of:
+        clauses: list of Clause
+        domain: constants that unbound head arguments range over
+        edb: EDB whose relations are read in place (tables only hold
+            the relations clauses derive)
+    """
+
+    def __init__(self, clauses, domain, edb=None):
+        self.clauses = clauses
+        self.domain = domain
+        self.edb = edb
+        self.tables = {}
+
+        # (rel, tuple) -> (clause index, body facts) of first derivation
+        self.why = {}
+
+    def table(self, rel):
+        if self.edb is not None and rel in self.edb.rtuples:
+            return self.edb.tuples(rel)
+        if rel not in self.tables:
+            self.tables[rel] = Table()
+        return self.tables[rel]
+
+    """ extends binding env so that literal l matches tuple t """
+
+    def match(self, l, t, env):
+        env = dict(env)
+        for a, v in zip(l.args, t):
+            if not isVar(a):
+                if a != v:
+                    return None
+            elif a in env:
+                if env[a] != v:
+                    return None
+            else:
+                env[a] = v
+        return env
+
+    """ all bindings of literal l against table tbl consistent with env """
+
+    def join(self, l, tbl, env):
+        pos = []
+        key = []
+        for p, a in enumerate(l.args):
+            if not isVar(a):
+                pos.append(p)
+                key.append(a)
+            elif a in env:
+                pos.append(p)
+                key.append(env[a])
+
+        for t in tbl.lookup(tuple(pos), tuple(key)):
+            e = self.match(l, t, env)
+            if e is not None:
+                yield e
+
+    """ head tuples derived by clause c, reading body literal at
+        position dpos from delta (all others from the full tables) """
+
+    def fire(self, c, delta=None, dpos=None):
+        envs = [{}]
+        for p, l in enumerate(c.tail):
+            if p == dpos:
+                tbl = delta[l.rel]
+            else:
+                tbl = self.table(l.rel)
+
+            nenvs = []
+            for env in envs:
+                nenvs.extend(self.join(l, tbl, env))
+            envs = nenvs
+
+            if envs == []:
+                return
+
+        for env in envs:
+            free = []
+            for a in c.head.args:
+                if isVar(a) and a not in env and a not in free:
+                    free.append(a)
+
+            body = map(lambda l: (l.rel, self.ground(l, env)), c.tail)
+
+            # unbound head arguments range over the whole domain
+            for vals in product(self.domain, repeat=len(free)):
+                e = dict(env)
+                e.update(zip(free, vals))
+                yield (self.ground(c.head, e), body)
+
+    def ground(self, l, env):
+        return tuple([env[a] if isVar(a) else a for a in l.args])
+
+    """ adds derived tuples to the tables, remembering the clause and
+        body facts of their first derivation; returns the ones that were new """
+
+    def commit(self, derived):
+        delta = {}
+        for (rel, t, ci, body) in derived:
+            if self.table(rel).add(t):
+                self.why[(rel, t)] = (ci, body)
+                if rel not in delta:
+                    delta[rel] = Table()
+                delta[rel].add(t)
+        return delta
+
+    def evaluate(self):
+        # first round: every clause over the EDB
+        derived = []
+        for ci, c in enumerate(self.clauses):
+            for (t, body) in self.fire(c):
+                derived.append((c.head.rel, t, ci, body))
+        delta = self.commit(derived)
+
+        # following rounds only join against tuples new in the last round
+        while delta != {}:
+            derived = []
+            for ci, c in enumerate(self.clauses):
+                for p, l in enumerate(c.tail):
+                    if l.rel not in delta:
+                        continue
+                    for (t, body) in self.fire(c, delta, p):
+                        derived.append((c.head.rel, t, ci, body))
+            delta = self.commit(derived)
+
+        return self
+
+    def holds(self, rel, t):
+        if self.edb is not None and rel in self.edb.rtuples:
+            return tuple(t) in self.edb.tuples(rel)
+        return rel in self.tables and tuple(t) in self.tables[rel]
+
+    """ proof tree of a derived fact as a list of (rel, tuple, clause index),
+        premises before conclusions; EDB facts are leaves and not listed """
+
+    def derivation(self, rel, t):
+        steps = []
+        seen = set()
+
+        def visit(f):
+            if f in seen or f not in self.why:
+                return
+            seen.add(f)
+
+            (ci, body) = self.why[f]
+            for b in body:
+                visit(b)
+            steps.append((f[0], f[1], ci))
+
+        visit((rel, tuple(t)))
+        return steps
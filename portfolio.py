@@ -0,0 +1,187 @@
+from multiprocessing import Process, Queue
+from timeit import default_timer as timer
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+from taskfile import *
+# after the wildcard import, which brings z3's Empty
+from Queue import Empty
+
+log = logging.getLogger("zaatar")
+
+# seconds between checks for configurations that died without a result
+POLL = 0.5
+
+
+class Config:
+    """ One member of a portfolio; consists of
+        name: label recorded in the history
+        options: overrides of the task's STask options
+        synth: overrides of the task's synthesize arguments
+    """
+
+    def __init__(self, name, options=None, synth=None):
+        self.name = name
+        self.options = {} if options is None else options
+        self.synth = {} if synth is None else synth
+
+    def __repr__(self):
+        return self.name
+
+
+""" default portfolio of spec: the configuration of the task file,
+    the encoding flags toggled, the other variable encoding, one more
+    frame, one more literal per clause, and a few solver seeds """
+
+
+def defaultConfigs(spec):
+    opts = spec.get("options", {})
+    synth = spec["synthesize"]
+
+    configs = [Config("file")]
+
+    soft = opts.get("soft", True)
+    configs.append(Config("soft=" + str(not soft), {"soft": not soft}))
+
+    chain = opts.get("chain", False)
+    configs.append(Config("chain=" + str(not chain), {"chain": not chain}))
+
+    # integer vs bitvector reasoning in the solver
+    encoding = opts.get("encoding", "int")
+    other = {"int": "bv", "bv": "int"}[encoding]
+    configs.append(Config("encoding=" + other, {"encoding": other}))
+
+    configs.append(Config("bound+1", synth={"bound": synth["bound"] + 1}))
+    configs.append(Config("nl+1", synth={"nl": synth["nl"] + 1}))
+
+    for seed in [1, 2, 3]:
+        configs.append(Config("seed=" + str(seed), {"seed": seed}))
+
+    return configs
+
+
+""" past wins of every configuration name on the task called name """
+
+
+def loadWins(history, name):
+    wins = {}
+    if history is None or not os.path.exists(history):
+        return wins
+
+    for line in open(history):
+        r = json.loads(line)
+        if r["task"] == name and r["winner"] is not None:
+            wins[r["winner"]] = wins.get(r["winner"], 0) + 1
+
+    return wins
+
+
+def record(history, name, winner, wall, stats):
+    if history is None:
+        return
+
+    r = {"task": name, "winner": winner, "time": wall, "stats": stats}
+    f = open(history, "a")
+    f.write(json.dumps(r) + "\n")
+    f.close()
+
+
+def runConfig(spec, idx, config, q):
+    # keep the solver chatter of the racing processes out of our output
+    sys.stdout = open(os.devnull, "w")
+
+    try:
+        (s, params) = makeTask(spec, **config.options)
+        params.update(config.synth)
+        stats = s.synthesize(**params)
+    except Exception as e:
+        q.put((idx, None, None, repr(e)))
+        return
+
+    if stats == False:
+        q.put((idx, None, None, "no solution"))
+    else:
+        q.put((idx, stats, map(str, s.clauses), None))
+
+
+""" races the configurations of spec in separate processes (at most jobs
+    at once, historically best first; a failed configuration makes room
+    for the next one) and returns (winning config, stats, clauses) of
+    the first verified program, or None if every configuration failed or
+    timeout seconds passed """
+
+
+def solvePortfolio(spec, configs=None, jobs=None, timeout=None, history=None):
+    if configs is None:
+        configs = defaultConfigs(spec)
+
+    wins = loadWins(history, spec["name"])
+    configs = sorted(configs, key=lambda c: -wins.get(c.name, 0))
+
+    jobs = jobs or multiprocessing.cpu_count()
+
+    q = Queue()
+    procs = []
+
+    def startNext():
+        i = len(procs)
+        p = Process(target=runConfig, args=(spec, i, configs[i], q))
+        p.start()
+        procs.append(p)
+
+    start = timer()
+    res = None
+
+    while len(procs) < min(jobs, len(configs)):
+        startNext()
+
+    # configurations that have not reported yet
+    running = set(range(0, len(procs)))
+
+    while running:
+        if timeout is not None and timer() - start >= timeout:
+            break
+
+        try:
+            (i, stats, clauses, err) = q.get(True, POLL)
+        except Empty:
+            # runConfig always reports before a normal exit; a process
+            # killed by a signal, an OOM kill or a memory limit does not
+            dead = [j for j in running if procs[j].exitcode not in [None, 0]]
+            if dead == []:
+                continue
+            i = dead[0]
+            (stats, clauses, err) = (None, None, "exited with %s" % procs[i].exitcode)
+
+        # a result from a process counted as dead already
+        if i not in running:
+            continue
+
+        running.discard(i)
+        if stats is not None:
+            res = (configs[i], stats, clauses)
+            break
+
+        log.warning("portfolio: %s failed: %s", configs[i], err)
+
+        procs[i].join()
+        if len(procs) < len(configs):
+            startNext()
+            running.add(len(procs) - 1)
+
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+        p.join()
+
+    wall = timer() - start
+
+    if res is None:
+        record(history, spec["name"], None, wall, None)
+        return None
+
+    record(history, spec["name"], res[0].name, wall, res[1])
+    return res
@@ -1,22 +1,5 @@
-# non-recursive
-X='python bench.py -l -b'
-$X P3
-$X P4
-$X RedBlue
-$X RedBlueS
-$X Triangle
-$X 2C
-
-# recursive
-$X TC
-$X UTC
-$X EP
-$X OP
-$X OP3
-$X OP4
-$X SG
-$X AP
-$X RB
-$X INV
-$X And3
-$X And
+#!/bin/sh
+# runs the non-recursive and recursive benchmarks in parallel and
+# writes median/min/max of their stats to res.csv;
+# see python runner.py -h for timeouts, memory limits and repetitions
+python runner.py -o res.csv "$@"
@@ -0,0 +1,227 @@
+from multiprocessing.pool import ThreadPool
+from timeit import default_timer as timer
+import argparse
+import multiprocessing
+import os
+import resource
+import signal
+import subprocess
+import sys
+import threading
+
+from atomicfile import writeAtomic
+
+# benchmarks of the paper's evaluation, as in results.sh
+NONRECURSIVE = ["P3", "P4", "RedBlue", "RedBlueS", "Triangle", "2C"]
+RECURSIVE = ["TC", "UTC", "EP", "OP", "OP3", "OP4", "SG", "AP", "RB",
+             "INV", "And3", "And"]
+
+# columns of STask.stats()
+STAT_FIELDS = ["time", "iters", "facts", "irels", "orels", "pos", "neg",
+               "nc", "nl", "encode", "verify", "block", "asserts"]
+
+
+class Run:
+    """ One execution of a benchmark; consists of
+        bench: benchmark name
+        status: "ok", "timeout", "fail"
+        wall: wall clock time of the process
+        stats: values of STask.stats() when status is "ok"
+    """
+
+    def __init__(self, bench, status, wall, stats=None):
+        self.bench = bench
+        self.status = status
+        self.wall = wall
+        self.stats = stats
+
+    def __repr__(self):
+        return "%s %s %.2fs" % (self.bench, self.status, self.wall)
+
+
+""" preexec_fn of a benchmark process: it leads a new session, so that
+    its process group takes its pool or portfolio children along when
+    killed, and may use at most mb MB of address space """
+
+
+def childSetup(mb):
+    def setup():
+        os.setsid()
+        if mb is not None:
+            lim = mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (lim, lim))
+    return setup
+
+
+# preexec_fn runs Python code between fork and exec, which is not safe
+# while other threads fork too; the runner's threads start children
+# one at a time
+spawnLock = threading.Lock()
+
+
+""" runs bench.py on bench in a child process; the process and its
+    children are killed after timeout seconds and may use at most mem MB
+    of address space each """
+
+
+def runBench(bench, timeout=None, mem=None, path=None, options=[]):
+    cmd = [sys.executable, "bench.py", "-b", bench]
+    if path is not None:
+        cmd = cmd + ["-f", os.path.abspath(path)]
+    for o in options:
+        cmd = cmd + ["-s", o]
+    cwd = os.path.dirname(os.path.abspath(__file__))
+
+    start = timer()
+    with spawnLock:
+        p = subprocess.Popen(cmd, cwd=cwd, stdout=subprocess.PIPE,
+                             stderr=subprocess.STDOUT,
+                             preexec_fn=childSetup(mem))
+
+    killed = []
+
+    def kill():
+        killed.append(True)
+        # children still hold stdout, so communicate only returns once
+        # the whole group is gone
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except OSError:
+            pass
+
+    killer = None
+    if timeout is not None:
+        killer = threading.Timer(timeout, kill)
+        killer.start()
+
+    out = p.communicate()[0]
+    if killer is not None:
+        killer.cancel()
+    wall = timer() - start
+
+    if killed:
+        return Run(bench, "timeout", wall)
+
+    lines = out.strip().splitlines()
+    if p.returncode != 0 or lines == []:
+        return Run(bench, "fail", wall)
+
+    # bench.py prints the stats row last: name, stat, stat, ...
+    row = map(lambda x: x.strip(), lines[-1].split(","))
+    if row[0] != bench:
+        return Run(bench, "fail", wall)
+
+    try:
+        stats = map(float, row[1:])
+    except ValueError:
+        # e.g. "no solution"
+        return Run(bench, "fail", wall)
+
+    return Run(bench, "ok", wall, stats)
+
+
+def median(l):
+    l = sorted(l)
+    n = len(l)
+    if n % 2 == 1:
+        return l[n // 2]
+    return (l[n // 2 - 1] + l[n // 2]) / 2.0
+
+
+""" one row per benchmark: #runs, #ok, then median/min/max of the wall
+    time and of every stats() field over the successful runs """
+
+
+def summarize(bench, runs):
+    ok = filter(lambda r: r.status == "ok", runs)
+    row = [bench, len(runs), len(ok)]
+
+    cols = [map(lambda r: r.wall, ok)]
+    width = len(STAT_FIELDS)
+    if ok != []:
+        width = len(ok[0].stats)
+    for i in range(0, width):
+        cols.append(map(lambda r: r.stats[i], ok))
+
+    for c in cols:
+        if c == []:
+            row = row + ["", "", ""]
+        else:
+            row = row + ["%.2f" % median(c), "%.2f" % min(c), "%.2f" % max(c)]
+
+    return row
+
+
+def header(width):
+    names = STAT_FIELDS + ["stat" + str(i)
+                           for i in range(len(STAT_FIELDS), width)]
+    h = ["benchmark", "runs", "ok"]
+    for n in ["wall"] + names[0:width]:
+        h = h + [n + "_med", n + "_min", n + "_max"]
+    return h
+
+
+def runAll(benches, jobs=None, timeout=None, mem=None, reps=1, path=None,
+           options=[]):
+    # threads only wait on the child processes doing the work
+    pool = ThreadPool(jobs or multiprocessing.cpu_count())
+
+    work = []
+    for b in benches:
+        for i in range(0, reps):
+            work.append(b)
+
+    def run(b):
+        r = runBench(b, timeout, mem, path, options)
+        print r
+        sys.stdout.flush()
+        return r
+
+    runs = pool.map(run, work, chunksize=1)
+    pool.close()
+
+    res = {}
+    for r in runs:
+        res.setdefault(r.bench, []).append(r)
+
+    return map(lambda b: summarize(b, res[b]), benches)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Zaatar: parallel benchmark runner')
+
+    parser.add_argument("benchmarks", nargs="*",
+                        help="benchmarks to run (default: all of results.sh)")
+
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of benchmarks run at once (default: #cpus)")
+
+    parser.add_argument("-t", "--timeout", type=float, default=None,
+                        help="timeout per run in seconds")
+
+    parser.add_argument("-m", "--mem", type=int, default=None,
+                        help="memory limit per run in MB")
+
+    parser.add_argument("-r", "--reps", type=int, default=1,
+                        help="repetitions of every benchmark")
+
+    parser.add_argument("-o", "--out", default="res.csv",
+                        help="results file")
+
+    parser.add_argument("-f", "--file", default=None,
+                        help="task file the benchmarks are read from")
+
+    parser.add_argument("-s", "--set", action="append", default=[],
+                        metavar="KEY=VALUE",
+                        help="STask option passed on to bench.py")
+
+    args = parser.parse_args()
+
+    benches = args.benchmarks or (NONRECURSIVE + RECURSIVE)
+    rows = runAll(benches, args.jobs, args.timeout, args.mem, args.reps,
+                  args.file, args.set)
+
+    width = max(map(lambda r: (len(r) - 6) // 3, rows))
+    text = "".join(map(lambda r: ", ".join(map(str, r)) + "\n",
+                       [header(width)] + rows))
+    writeAtomic(args.out, text)
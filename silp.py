@@ -1,6 +1,74 @@
 from z3 import *
 from itertools import *
+from contextlib import contextmanager
 from timeit import default_timer as timer
+from multiprocessing import Pool
+import hashlib
+import json
+import logging
+import os
+from atomicfile import writeAtomic
+from datalog import Evaluator, Table
+from timing import Profile, astSize, numConjuncts, z3Stats
+
+# progress is logged at INFO, formulas at DEBUG; arguments are only
+# formatted if the level is enabled
+log = logging.getLogger("zaatar")
+log.addHandler(logging.NullHandler())
+
+# whole encodings as SMT-LIB, logged at DEBUG once a handler (e.g. a
+# file) is attached and the level lowered; kept out of the regular log
+# and independent of its level, as building the text is expensive
+encLog = logging.getLogger("zaatar.encoding")
+encLog.propagate = False
+encLog.setLevel(logging.WARNING)
+encLog.addHandler(logging.NullHandler())
+
+# body literal permutations are enumerated when generalizing
+# counterexamples only for clauses up to this length
+MAX_PERM_LITS = 4
+
+
+""" number of bits of an unsigned bitvector holding 0..hi """
+
+
+def bitWidth(hi):
+    return max(1, hi.bit_length())
+
+
+# z3 sorts declared so far, by context and declaration; every task in
+# a process shares them instead of redeclaring identically named sorts
+sorts = {}
+
+
+""" datatype name with one constructor "tuple" of arity fields of sort
+    field """
+
+
+def tupleSort(name, arity, field):
+    key = (field.ctx, "tuple", name, arity, field.sexpr())
+    if key not in sorts:
+        s = Datatype(name, ctx=field.ctx)
+        dec = []
+        for i in range(1, arity + 1):
+            dec.append((name + '_i' + str(i), field))
+        # constructors and accessors are named after the sort so that
+        # the SMT-LIB2 text of an encoding declares each only once
+        s.declare(name + '_tuple', *dec)
+        sorts[key] = s.create()
+    return sorts[key]
+
+
+def mkTuple(sort, args):
+    return sort.constructor(0)(*args)
+
+
+def domainSort(name, size, ctx=None):
+    ctx = ctx or main_ctx()
+    key = (ctx, "finite", name, size)
+    if key not in sorts:
+        sorts[key] = FiniteDomainSort(name, size, ctx)
+    return sorts[key]
 
 
 class Relation:
@@ -49,9 +117,11 @@ class Literal:
         return self.rel.name + "(" + args + ")"
 
 
-class Fact:
+class Fact(object):
     """ Fact: tuple ftuple of relation rel """
 
+    __slots__ = ["rel", "ftuple"]
+
     def __init__(self, rel, *t):
         self.rel = rel
         self.ftuple = t
@@ -62,6 +132,12 @@ class Fact:
         c2 = self.ftuple == other.ftuple
         return c1 and c2
 
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash((self.rel, self.ftuple))
+
     def __repr__(self):
         return self.rel.name + str(self.ftuple)
 
@@ -76,14 +152,28 @@ class EDB:
         self.irels = irels
         self.facts = facts
 
+        # check no repeated decl of same relation
+        assert(len(set(irels)) == len(irels))
+
+        # tuples of each relation; the evaluator joins against these
+        # directly (see Table)
+        self.rtuples = {}
+        for r in irels:
+            self.rtuples[r] = Table()
+
         # check all facts belong to declared relations
         for f in facts:
-            assert(len(filter(lambda r: r == f.rel, irels)) == 1)
+            assert(f.rel in self.rtuples)
+            self.rtuples[f.rel].add(f.ftuple)
 
-        # check no repeated decl of same relation
-        # TODO: fix when relations are hashable
-        #assert(len(set(irels)) == len(irels))
-        #assert(len(set(orels)) == len(orels))
+    def tuples(self, r):
+        return self.rtuples[r]
+
+    """ (relation, tuple) of every fact, in the order of facts """
+
+    def pairs(self):
+        for f in self.facts:
+            yield (f.rel, f.ftuple)
 
     def __repr__(self):
         return "irels " + str(self.irels) + "\nfacts " + str(self.facts)
@@ -106,6 +196,80 @@ class Clause:
         return str(self.head) + " :- " + tailStr
 
 
+""" clause c in a normal form: duplicate body literals are dropped and
+    of all orders of the body literals, with variables renamed in order
+    of first occurrence, the smallest is taken (above MAX_PERM_LITS
+    literals only the order sorted by the original names) """
+
+
+def canonicalClause(c):
+    body = sorted(set(c.tail), key=str)
+    if len(body) <= MAX_PERM_LITS:
+        orders = permutations(body)
+    else:
+        orders = [body]
+
+    best = None
+    for order in orders:
+        names = {}
+
+        def rename(lit):
+            args = []
+            for a in lit.args:
+                if a not in names:
+                    names[a] = "X" + str(len(names) + 1)
+                args.append(names[a])
+            return lit.rel.name + "(" + ", ".join(args) + ")"
+
+        head = rename(c.head)
+        cs = head + " :- " + ", ".join(map(rename, order))
+        if best is None or cs < best:
+            best = cs
+    return best
+
+
+""" key of a program up to the order of its clauses and body literals,
+    duplicates and variable names """
+
+
+def programKey(clauses):
+    cs = sorted(set(map(canonicalClause, clauses)))
+    return hashlib.md5("\n".join(cs)).hexdigest()
+
+
+class Counterexample:
+    """ Reason a candidate program was refuted; consists of
+        fact: missing positive or spuriously derived negative fact
+        positive: True iff fact is a missing positive example
+        derivation: for negative facts, the proof of fact as a list of
+            (Fact, clause index) -- None if it is not known
+    """
+
+    def __init__(self, fact, positive, derivation=None):
+        self.fact = fact
+        self.positive = positive
+        self.derivation = derivation
+
+    """ indices of the clauses used to derive a negative fact """
+
+    def used(self):
+        return sorted(set(map(lambda (f, ci): ci, self.derivation)))
+
+    def __repr__(self):
+        if self.positive:
+            return "missing " + str(self.fact)
+        return "derived " + str(self.fact) + " via " + str(self.derivation)
+
+
+# the task whose candidates the processes of a batch mode pool verify;
+# set before the pool forks
+verifying = None
+
+
+def verifyInChild(clauses):
+    return verifying.findCounterexample(clauses)
+
+
 class STask:
     """ Synthesis task; consists of
         edb: extensional database
@@ -116,25 +280,312 @@ class STask:
             (models finite domain)
     """
 
-    def __init__(self, edb, orels, pf, nf, domain, base=1, chain=False, soft=True,andersen=False):
+    def __init__(self, edb, orels, pf, nf, domain, base=1, chain=False,
+                 soft=True, andersen=False, incremental=False,
+                 verifier="native", generalize=False, seed=None,
+                 profile=False, encoding="int", relations="array",
+                 closedWorld="full", symmetry=False, verifyCache=None,
+                 resultCache=None, batch=1, jobs=None, explain=False,
+                 objective="soft", encodingCache=None, maxsatEngine=None):
         self.edb = edb
         self.orels = orels
         self.pfacts = pf
         self.nfacts = nf
         self.domain = domain
+
+        # relations are numbered 1..n (EDB) and n+1..m (IDB) in the
+        # encoding; relById and relIds map between ids and relations,
+        # arities maps ids to arities
+        self.rels = edb.irels + orels
+        self.relById = {}
+        self.relIds = {}
+        self.arities = {}
+        for i, r in enumerate(self.rels):
+            self.relById[i + 1] = r
+            self.relIds[r] = i + 1
+            self.arities[i + 1] = r.arity
+
         self.time = 0
         self.chain = chain
         self.base = base
         self.soft = soft
         self.andersen=andersen
 
-        # check all facts belong to declared relations
+        # preference among candidates: "soft" weighs every pair of equal
+        # body literals (getSoft, only with soft), "none" takes any model
+        # of a plain Solver, "size" minimizes the number of distinct body
+        # literals (getDuplicates) and "maxsat" asks for the same
+        # duplicates as soft constraints
+        assert(objective in ["soft", "none", "size", "maxsat"])
+        self.objective = objective
+
+        # MaxSAT engine of Optimize for the soft constraints of "soft"
+        # and "maxsat" (None: z3's default, maxres)
+        # (z3 takes parameter values as str only, task files give unicode)
+        assert(maxsatEngine in [None, "maxres", "pd-maxres", "wmax"])
+        if maxsatEngine is not None:
+            maxsatEngine = str(maxsatEngine)
+        self.maxsatEngine = maxsatEngine
+
+        # keep one solver alive across CEGIS iterations and only add
+        # the blocking clause of each refuted candidate
+        self.incremental = incremental
+
+        # "native" evaluates candidates with the built-in Datalog
+        # engine, "z3" with Fixedpoint, "both" cross-checks the two
+        assert(verifier in ["native", "z3", "both"])
+        self.verifier = verifier
+
+        # block every candidate refuted by the same counterexample
+        # instead of only the refuted model itself
+        self.generalize = generalize
+
+        # random seed of the solver (None: z3's default)
+        self.seed = seed
+
+        # "int" models selectors, arguments and latches as integers
+        # with range constraints, "bv" as bitvectors just wide enough
+        # for their range
+        assert(encoding in ["int", "bv"])
+        self.encoding = encoding
+
+        # "array" models each relation at each frame as an array from
+        # tuples to Bool, "bool" as one Boolean per tuple of the domain,
+        # "trace" models IDB relations at frame l by the facts derived
+        # in frames 1..l (EDB relations as with "array"), so their size
+        # depends on the bound but not on the domain
+        assert(relations in ["array", "bool", "trace"])
+        self.relations = relations
+
+        # "full" asserts for every tuple of an EDB relation whether it is
+        # a fact, "sparse" defines EDB relations by their facts alone,
+        # so lookups at latches become disjunctions over the facts
+        # (the Boolean backend holds EDB relations as constants anyway)
+        assert(closedWorld in ["full", "sparse"])
+        self.closedWorld = closedWorld
+
+        # rule out candidates that only differ from another one by the
+        # order of clauses or body literals or by variable names
+        self.symmetry = symmetry
+
+        # outcome of verifying each program so far, by programKey; with
+        # verifyCache, outcomes are also read from and appended to that
+        # file (JSON lines), for every task with the same taskKey
+        self.outcomes = {}
+        self.verifyCache = verifyCache
+        self.taskHash = None
+        if verifyCache is not None:
+            self.loadOutcomes()
+
+        # candidates per CEGIS round, verified by jobs processes (None:
+        # one per cpu); batch > 1 implies an incremental solver
+        self.batch = batch
+        self.jobs = jobs
+        self.pool = None
+        if batch > 1:
+            self.incremental = True
+
+        # directory of programs synthesize found before, one file per
+        # fingerprint; a program found there is only verified again
+        self.resultCache = resultCache
+
+        # directory of the encodings synthesize built before, as SMT-LIB2
+        # with a JSON map of the clause variables, by fingerprint; a
+        # stored encoding is parsed instead of built again
+        self.encodingCache = encodingCache
+
+        # the verified program once synthesize succeeds
+        self.clauses = None
+
+        # CEGIS iterations so far
+        self.iters = 0
+
+        # assumptions in the unsat core of the last failed check
+        self.core = None
+
+        # assert the constraint groups of synthesize and deepen under
+        # assumptions named after them (see nameGroups), so the core of
+        # a failed size tells which of them conflict
+        self.explain = explain
+
+        # phase timings and counters; profile also measures the
+        # encoding size, which walks the whole formula
+        self.prof = Profile()
+        self.profile = profile
+
+        # check no repeated decl of same relation, and all facts
+        # belong to declared relations
+        assert(len(set(orels)) == len(orels))
+        outs = set(orels)
         for f in (nf + pf):
-            assert(len(filter(lambda r: r == f.rel, self.orels)) == 1)
+            assert(f.rel in outs)
 
     def verify(self, clauses):
+        return self.findCounterexample(clauses) is None
+
+    """ identifies the EDB, examples and domain: programs are verified
+        against these only; computed once, as it hashes the whole EDB """
+
+    def taskKey(self):
+        if self.taskHash is None:
+            self.taskHash = self.hashTask()
+        return self.taskHash
+
+    def hashTask(self):
+        def fact(f):
+            return [f.rel.name] + list(f.ftuple)
+
+        # EDB facts are summed up in any order and without a list of
+        # them, as the EDB may be large
+        edb = 0
+        for (r, t) in self.edb.pairs():
+            h = hashlib.md5(json.dumps([r.name] + list(t))).hexdigest()
+            edb = (edb + int(h, 16)) % 2 ** 128
+
+        key = [map(lambda r: [r.name, r.arity], self.rels),
+               "%032x" % edb,
+               sorted(map(fact, self.pfacts)),
+               sorted(map(fact, self.nfacts)),
+               self.domain]
+        return hashlib.md5(json.dumps(key)).hexdigest()
+
+    """ findCounterexample, skipped for programs equivalent to one
+        verified before; the proof of a cached counterexample is
+        dropped, as its clause indices refer to the other program """
+
+    def checkCandidate(self, clauses):
+        key = programKey(clauses)
+        if key in self.outcomes:
+            self.prof.count("cached")
+            cex = self.outcomes[key]
+            if cex is None:
+                return None
+            return Counterexample(cex.fact, cex.positive)
+
+        cex = self.findCounterexample(clauses)
+        self.recordOutcome(key, cex)
+        return cex
+
+    def recordOutcome(self, key, cex):
+        self.outcomes[key] = cex
+        if self.verifyCache is not None:
+            self.saveOutcome(key, cex)
+
+    """ identifies a synthesize call: the task, its options, the
+        arguments and the z3 version """
+
+    def fingerprint(self, nc, nl, bound):
+        opts = {"base": self.base, "chain": self.chain, "soft": self.soft,
+                "andersen": self.andersen, "incremental": self.incremental,
+                "verifier": self.verifier, "generalize": self.generalize,
+                "seed": self.seed, "encoding": self.encoding,
+                "relations": self.relations, "closedWorld": self.closedWorld,
+                "symmetry": self.symmetry, "objective": self.objective,
+                "maxsatEngine": self.maxsatEngine}
+        key = [self.taskKey(), opts, nc, nl, bound, get_version_string()]
+        return hashlib.md5(json.dumps(key, sort_keys=True)).hexdigest()
+
+    def resultPath(self, nc, nl, bound):
+        return os.path.join(self.resultCache, self.fingerprint(nc, nl, bound) + ".json")
+
+    """ the stats of the program cached for this call if it still
+        verifies, None otherwise """
+
+    def cachedResult(self, nc, nl, bound):
+        path = self.resultPath(nc, nl, bound)
+        if not os.path.exists(path):
+            return None
+
+        with open(path) as f:
+            r = json.load(f)
+        rels = dict(map(lambda r: (r.name, r), self.rels))
+
+        def lit(l):
+            return rels[l[0]].l(*map(str, l[1]))
+
+        clauses = map(lambda c: Clause(lit(c[0]), map(lit, c[1])), r["clauses"])
+        if not self.verify(clauses):
+            log.warning("cached program in %s does not verify", path)
+            return None
+
+        log.info("verified cached program %s", path)
+        self.clauses = clauses
+        return r["stats"]
+
+    def storeResult(self, nc, nl, bound, stats):
+        def lit(l):
+            return [l.rel.name, list(l.args)]
+
+        clauses = map(lambda c: [lit(c.head), map(lit, c.tail)], self.clauses)
+        r = {"clauses": clauses, "stats": stats}
+
+        writeAtomic(self.resultPath(nc, nl, bound), json.dumps(r) + "\n")
+
+    def loadOutcomes(self):
+        if not os.path.exists(self.verifyCache):
+            return
+
+        task = self.taskKey()
+        rels = dict(map(lambda r: (r.name, r), self.rels))
+        for line in open(self.verifyCache):
+            r = json.loads(line)
+            if r["task"] != task:
+                continue
+            if r["fact"] is None:
+                self.outcomes[r["program"]] = None
+            else:
+                f = Fact(rels[r["fact"][0]], *r["fact"][1:])
+                self.outcomes[r["program"]] = Counterexample(f, r["positive"])
+
+    def saveOutcome(self, key, cex):
+        r = {"task": self.taskKey(), "program": key, "fact": None}
+        if cex is not None:
+            r["fact"] = [cex.fact.rel.name] + list(cex.fact.ftuple)
+            r["positive"] = cex.positive
+
+        f = open(self.verifyCache, "a")
+        f.write(json.dumps(r) + "\n")
+        f.close()
+
+    """ returns None if clauses are correct on all examples and a
+        Counterexample otherwise """
+
+    def findCounterexample(self, clauses):
+        if self.verifier == "z3":
+            return self.verifyZ3(clauses)
+
+        res = self.verifyNative(clauses)
+
+        if self.verifier == "both":
+            assert((res is None) == (self.verifyZ3(clauses) is None))
+
+        return res
+
+    """ computes the least model of clauses once and checks
+        all examples by membership """
+
+    def verifyNative(self, clauses):
+        # same universe as FiniteDomainSort('D', domain) in verifyZ3
+        ev = Evaluator(clauses, range(0, self.domain), self.edb).evaluate()
+
+        for p in self.pfacts:
+            if not ev.holds(p.rel, p.ftuple):
+                log.info("Missing pos %s", p)
+                return Counterexample(p, True)
+
+        for n in self.nfacts:
+            if ev.holds(n.rel, n.ftuple):
+                steps = ev.derivation(n.rel, n.ftuple)
+                deriv = map(lambda (r, t, ci): (Fact(r, *t), ci), steps)
+                cex = Counterexample(n, False, deriv)
+                log.info("Derived neg %s", cex)
+                return cex
+
+        return None
+
+    def verifyZ3(self, clauses):
         s = Fixedpoint()
-        d = FiniteDomainSort('D', self.domain)
+        d = domainSort('D', self.domain)
         consts = {}
 
         args = {}
@@ -155,9 +606,9 @@ class STask:
             lz3 = rels[lrel](*argsToZ3(l.args))
             return lz3
 
-        def factToZ3(l):
-            r = rels[l.rel]
-            args = map(lambda v: consts[v], l.ftuple)
+        def factToZ3(rel, t):
+            r = rels[rel]
+            args = map(lambda v: consts[v], t)
             return r(*args)
 
         # create array of constant values for the given domain:
@@ -165,12 +616,12 @@ class STask:
             consts[i] = FiniteDomainVal(i, d)
 
         # register relations in Z3
-        for r in self.edb.irels + self.orels:
-            print r
+        for r in self.rels:
+            log.debug("%s", r)
             dom = [d for i in range(0, r.arity)] + [BoolSort()]
             rz3 = Function(r.name, *dom)
             rels[r] = rz3
-            print "registering ", r, " - > ", rz3
+            log.debug("registering %s - > %s", r, rz3)
             s.register_relation(rz3)
 
         # create argument variables for clauses
@@ -180,32 +631,32 @@ class STask:
             s.rule(head, body)
 
         # add all facts in EDB
-        for f in self.edb.facts:
-            s.fact(factToZ3(f))
+        for (r, t) in self.edb.pairs():
+            s.fact(factToZ3(r, t))
 
-        print "Created Z3 Fixedpoint"
-        print s
-        print "Now checking queries"
+        log.debug("Created Z3 Fixedpoint")
+        log.debug("%s", s)
+        log.debug("Now checking queries")
 
         # check pos examples
         for p in self.pfacts:
-            print "Checking pos", p, "-->", factToZ3(p)
+            log.debug("Checking pos %s --> %s", p, factToZ3(p.rel, p.ftuple))
 
-            if s.query(factToZ3(p)) == unsat:
-                return False
+            if s.query(factToZ3(p.rel, p.ftuple)) == unsat:
+                return Counterexample(p, True)
 
         # check neg examples
         for n in self.nfacts:
-            print "Checking neg", n, "-->", Not(factToZ3(n))
+            log.debug("Checking neg %s --> %s", n, Not(factToZ3(n.rel, n.ftuple)))
 
-            if s.query(Not(factToZ3(n))) == unsat:
-                return False
+            if s.query(Not(factToZ3(n.rel, n.ftuple))) == unsat:
+                return Counterexample(n, False)
 
-        return True
+        return None
 
     def getMaxArity(self):
         na = 0
-        for r in (self.orels + self.edb.irels):
+        for r in self.rels:
             if (r.arity > na):
                 na = r.arity
 
@@ -213,13 +664,7 @@ class STask:
         return na
 
     def idToRel(self, relId):
-        i = 1
-        for r in self.edb.irels + self.orels:
-            #print r
-            if relId == i:
-                return r
-
-            i = i + 1
+        return self.relById.get(relId)
 
     def idsToLit(self, relId, hargsId):
         r = self.idToRel(relId)
@@ -242,48 +687,118 @@ class STask:
             # print bLit
 
         clause = Clause(headLiteral, bLiterals)
-        print clause
+        log.debug("%s", clause)
         return clause
 
 
-    def solveConst(self, phi, pos, softC):
-        s = Optimize()
+    """ creates a solver holding constraint phi, positive facts pos
+        and soft constraints softC, weighed as objective says """
 
-        s.add(phi)
-        s.add(And(*pos))
+    def mkSolver(self, phi, pos, softC):
+        # the seeds are global to z3 (Optimize takes none of its own), so
+        # they are reset to z3's default when this task sets none
+        seed = self.seed
+        if seed is None:
+            seed = 0
+        set_param("smt.random_seed", seed)
+        set_param("sat.random_seed", seed)
 
-        for c in softC:
-            s.add_soft(c)
+        with self.prof.phase("assert"):
+            if self.objective == "none":
+                s = Solver()
+            else:
+                s = Optimize()
+            if self.maxsatEngine is not None and self.objective != "none":
+                s.set("maxsat_engine", self.maxsatEngine)
+
+            s.add(phi)
+            s.add(And(*pos))
+
+            if self.objective == "size":
+                # with one literal per clause there is nothing to count
+                if softC != []:
+                    s.minimize(Sum([If(c, 0, 1) for c in softC]))
+            else:
+                for c in softC:
+                    s.add_soft(c)
+
+        # size of the last formula handed to a solver
+        if encLog.isEnabledFor(logging.DEBUG):
+            encLog.debug("%s", s.sexpr())
+
+        self.prof.set("asserts", numConjuncts(phi) + len(pos))
+        self.prof.set("soft", len(softC))
+        if self.profile:
+            self.prof.set("nodes", astSize(And(phi, *pos)))
 
+        return s
+
+    def solveConst(self, phi, pos, softC):
+        return self.checkSolver(self.mkSolver(phi, pos, softC))
+
+    """ checks solver s and extracts the candidate clauses from its model """
+
+    def checkSolver(self, s, assumptions=[]):
         start = timer()
-        res = s.check()
+        res = s.check(*assumptions)
         end = timer()
         self.time = self.time + (end - start)
+        # z3's statistics are only collected for a requested profile
+        stats = None
+        if self.profile:
+            stats = z3Stats(s)
+        self.prof.check(end - start, res, stats)
 
-        print res
+        log.debug("%s", res)
 
         if res == unsat:
-            print "No solution found -- unsat"
+            log.debug("No solution found -- unsat")
+            if assumptions != []:
+                self.core = s.unsat_core()
             return (None, None)
         else:
             m = s.model()
-            print "MODEL:", m
+            log.debug("MODEL: %s", m)
             cs = []
-            print self.nc
+            log.debug("%s", self.nc)
             for i in range(1, self.nc + 1):
                 cs.append(self.modelToClause(m, i))
 
         return (cs, m)
 
     def getZ3Sort(self, r):
-        s = Datatype(r.name + '_t')
-        dec = []
-        for i in range(1, r.arity + 1):
-            dec.append(('i' + str(i), IntSort()))
+        if self.encoding == "bv":
+            field = BitVecSort(bitWidth(self.domain - 1))
+            return tupleSort(r.name + '_bv_t', r.arity, field)
+
+        return tupleSort(r.name + '_t', r.arity, IntSort())
 
-        s.declare('tuple', *dec)
+    """ variable called name ranging over 1..hi, see encoding """
 
-        return s.create()
+    def mkVar(self, name, hi):
+        if self.encoding == "bv":
+            return BitVec(name, bitWidth(hi))
+        return Int(name)
+
+    # comparisons of variables made by mkVar; bitvectors compare
+    # unsigned
+    def atLeast(self, v, k):
+        if is_bv(v):
+            return UGE(v, k)
+        return v >= k
+
+    def atMost(self, v, k):
+        if is_bv(v):
+            return ULE(v, k)
+        return v <= k
+
+    def above(self, v, k):
+        if is_bv(v):
+            return UGT(v, k)
+        return v > k
+
+    def inRange(self, v, lo, hi):
+        return And(self.atLeast(v, lo), self.atMost(v, hi))
 
     def getSymmetry(self):
         const = []
@@ -291,7 +806,56 @@ class STask:
         for i in range(1, self.nc + 1):
             bs = self.bodies[i]
             for j in range(0, len(bs) - 1):
-                const.append(bs[j] <= bs[j + 1])
+                const.append(self.atMost(bs[j], bs[j + 1]))
+
+        return And(*const)
+
+    """ lex-leader symmetry breaking: body literals are ordered by
+        relation (not with chain, whose literal order matters), the
+        base clauses and the other clauses are ordered by their
+        relations (not with andersen, which fixes clauses by position),
+        and the variables of each clause are numbered in the order they
+        first occur; any program can be brought into this form, as
+        renaming variables keeps relations and their order """
+
+    def getSymmetryBreaking(self):
+        const = []
+
+        if not self.chain and not self.andersen:
+            const.append(self.getSymmetry())
+
+        if not self.andersen:
+            groups = [range(1, self.base + 1), range(self.base + 1, self.nc + 1)]
+            for g in groups:
+                for (i, j) in zip(g, g[1:]):
+                    const.append(self.lexLeq(self.clauseRels(i), self.clauseRels(j)))
+
+        for i in range(1, self.nc + 1):
+            const.append(self.getCanonicalVars(i))
+
+        return And(*const)
+
+    def clauseRels(self, i):
+        return [self.heads[i]] + self.bodies[i]
+
+    """ xs is lexicographically at most ys """
+
+    def lexLeq(self, xs, ys):
+        res = BoolVal(True)
+        for (x, y) in reversed(zip(xs, ys)):
+            res = Or(self.above(y, x), And(x == y, res))
+        return res
+
+    """ the first variable of clause i is 1, every other one is at most
+        one more than all variables before it """
+
+    def getCanonicalVars(self, i):
+        vs = self.getClauseArgs(i)
+
+        const = [vs[0] == 1]
+        for j in range(1, len(vs)):
+            prev = map(lambda v: self.atMost(vs[j] - 1, v), vs[0:j])
+            const.append(Or(*prev))
 
         return And(*const)
 
@@ -305,15 +869,15 @@ class STask:
 
         bargs = []
         for b in bs:
-            const.append(b >= 1)
-            const.append(b <= len(self.edb.irels))
+            const.append(self.atLeast(b, 1))
+            const.append(self.atMost(b, len(self.edb.irels)))
             bargs = bargs + self.argvars[b]
 
         for harg in self.argvars[head]:
             d = map(lambda x : x == harg , bargs)
             const.append(Or(*d))
 
-        print const
+        log.debug("%s", const)
 
         return And(*const)
 
@@ -360,7 +924,7 @@ class STask:
                 if (i+1) % 3 == 0:
                     const.append(a == bargs[i-1])
 
-        print const
+        log.debug("%s", const)
         #exit(1)
         return And(*const)
 
@@ -385,7 +949,7 @@ class STask:
                 preargs = preargs + self.argvars[bp]
 
             preargs = preargs + self.argvars[head]
-            print b, preargs
+            log.debug("%s %s", b, preargs)
 
             for a in args:
                 disj = []
@@ -417,7 +981,7 @@ class STask:
         dis = []
 
         for b in self.bodies[l]:
-            dis.append(And(b >= n + 1, b <= m))
+            dis.append(self.inRange(b, n + 1, m))
 
         return Or(*dis)
 
@@ -458,9 +1022,9 @@ class STask:
                     And(self.argvars[head][1] == first,
                     self.argvars[head][0] == last))
 
-        print headc
-        print const
-        print ds
+        log.debug("%s", headc)
+        log.debug("%s", const)
+        log.debug("%s", ds)
 
 
         # idb relations start at indices > n
@@ -471,7 +1035,7 @@ class STask:
         # at least one relation is IDB
         dis = []
         for b in bs[0:length]:
-            dis.append(And(b >= n + 1, b <= m))
+            dis.append(self.inRange(b, n + 1, m))
 
 
         return And(And(*const), Distinct(ds), headc)#, Or(*dis))
@@ -495,342 +1059,542 @@ class STask:
                     b2a = self.argvars[b2]
                     #consts =  consts + map(lambda (a,b): a == b,zip(ba,b2a))
                     l = map(lambda (a,b): a == b,zip(ba,b2a))
-                    consts  = consts + [And(b==b2,And(*l))]
-                    seen = seen + [(b,b2)]
+                    consts.append(And(b==b2,And(*l)))
+                    seen.append((b,b2))
 
         return consts
 
+    """ for each body literal but the first of a clause, whether it
+        repeats an earlier literal of that clause; a clause of nl literals
+        of which d are repeats has nl - d distinct ones """
+
+    def getDuplicates(self):
+        dups = []
+
+        for i in range(1, self.nc+1):
+            bs = self.bodies[i]
+
+            for j in range(1, len(bs)):
+                same = []
+                for b in bs[0:j]:
+                    l = map(lambda (a,b): a == b, zip(self.argvars[bs[j]], self.argvars[b]))
+                    same.append(And(bs[j] == b, And(*l)))
+                dups.append(Or(*same))
+
+        return dups
+
+    """ the constraints the objective prefers to hold, see objective """
+
+    def getObjective(self):
+        if self.objective == "soft":
+            if self.soft:
+                return self.getSoft()
+            return []
+        if self.objective == "none":
+            return []
+        return self.getDuplicates()
+
     """ simulation all enclosed here """
 
     def simulation(self):
+        initConsts = self.initSimulation()
+
+        frames = []
+        for i in range(1, self.bound + 1):
+            frames.append(self.addFrame(i))
+
+        symmetry = self.getDerivSymmetry(self.bound)
+        frames = And(*frames)
+        (pos,neg) = self.getCorrectness(self.bound)
 
-        # takes a fact and turns it into a Z3 tuple
-        def factToZ3Tuple(f):
-            t = tup[f.rel]
-            res = t.tuple(*f.ftuple)
-            return res
-
-        # create idbArrays
-        def createIdbArrays():
-            for r in self.orels:
-                for i in range(1, self.bound + 1):
-                    domain = self.getZ3Sort(r)
-                    tup[r] = domain
-
-                    arr = Array(r.name + str(i), domain, BoolSort())
-                    idbArr[r].append(arr)
-
-        def createInitConsts():
-            # create initial arrays for EDB relations
-            for r in self.edb.irels:
-                domain = self.getZ3Sort(r)
-                tup[r] = domain
-
-                print r.name
-                arr = Array(r.name, domain, BoolSort())
-                edbArr[r] = arr
-
-                edbFacts[r] = []
-
-            # create initial arrays for IDB relations
-            for r in self.orels:
-                domain = self.getZ3Sort(r)
-                tup[r] = domain
-
-                arr = Array(r.name + "0", domain, BoolSort())
-                idbArr[r] = [arr]
-
-            # go thru facts and encode them as array constraints
-            initConsts = []
-            for f in self.edb.facts:
-                t = factToZ3Tuple(f)
-                arr = edbArr[f.rel]
-                initConsts.append(Select(arr, t))
-                edbFacts[f.rel].append(f.ftuple)
-
-            # go thru frame (all not facts) and negate them
-            for r in self.edb.irels:
-
-                # go thru all possible combinations
-                for t in product(range(1, self.domain), repeat=r.arity):
-
-                    # if r(t) is a fact, skip it
-                    if t in edbFacts[r]:
-                        continue
 
-                    f = Fact(r, *t)
-                    tp = factToZ3Tuple(f)
-                    arr = edbArr[r]
-                    initConsts.append(Not(Select(arr, tp)))
-
-            # just as above, but initializing IDB -- where all facts are
-            # negative
-            for r in self.orels:
-                # go thru all possible combinations
-                for t in product(range(1, self.domain), repeat=r.arity):
-                    f = Fact(r, *t)
-                    tp = factToZ3Tuple(f)
-                    arr = idbArr[r][0]
-                    initConsts.append(Not(Select(arr, tp)))
+        applyAll = self.getApplyAll(self.bound)
+        log.debug("applyAll %s", applyAll)
 
+        #print "Correctness", correctness
+        # exit(1)
+        return (And(initConsts, frames, And(*neg), applyAll, symmetry), pos)
+
+    # takes a fact and turns it into a Z3 tuple
+    def factToZ3Tuple(self, f):
+        t = self.tup[f.rel]
+        res = mkTuple(t, f.ftuple)
+        return res
+
+    """ creates the simulation state and returns the constraints on
+        frame 0: EDB arrays hold exactly the facts, IDB arrays are empty """
+
+    def initSimulation(self):
+        self.edbArr = {}
+        self.edbFacts = {}
+
+        # facts of each EDB relation in order, for sparse select
+        self.factList = {}
+
+        self.tup = {}
+
+        self.idbArr = {}
+
+        # latches of each frame
+        self.frameArgs = {}
+
+        # clause applied at each frame
+        self.ruleArgs = []
+
+        initConsts = self.createInitConsts()
+
+        log.debug("idbArr %s", self.idbArr)
+        log.debug("tup %s", self.tup)
+
+        return And(*initConsts)
+
+    # create idbArrays of frame i
+    def createIdbArrays(self, i):
+        for r in self.orels:
+            if self.relations == "bool":
+                self.idbArr[r].append(self.mkBoolRel(r, r.name + str(i)))
+                continue
+
+            if self.relations == "trace":
+                self.idbArr[r].append(self.extendTrace(r, i))
+                continue
+
+            # the tuple sort of r is set up with frame 0
+            arr = Array(r.name + str(i), self.tup[r], BoolSort())
+            self.idbArr[r].append(arr)
+
+    def createInitConsts(self):
+        if self.relations == "bool":
+            return self.createInitBools()
+
+        edbArr = self.edbArr
+        edbFacts = self.edbFacts
+        idbArr = self.idbArr
+        tup = self.tup
+
+        # create initial arrays for EDB relations
+        for r in self.edb.irels:
+            edbFacts[r] = self.edb.tuples(r)
+
+            # sparse: EDB relations are their facts, see select
+            if self.closedWorld == "sparse":
+                edbArr[r] = edbFacts[r]
+                self.factList[r] = sorted(edbFacts[r])
+                continue
+
+            domain = self.getZ3Sort(r)
+            tup[r] = domain
+
+            log.debug("%s", r.name)
+            arr = Array(r.name, domain, BoolSort())
+            edbArr[r] = arr
+
+        # create initial arrays for IDB relations
+        for r in self.orels:
+            if self.relations == "trace":
+                # nothing derived yet
+                idbArr[r] = [[]]
+                continue
+
+            domain = self.getZ3Sort(r)
+            tup[r] = domain
+
+            arr = Array(r.name + "0", domain, BoolSort())
+            idbArr[r] = [arr]
+
+        initConsts = []
+        if self.closedWorld == "full":
+            initConsts = self.createEdbConsts()
+
+        if self.relations == "trace":
             return initConsts
 
-        # constrain head i assuming its set to IDB k
-        # at frame l
-        def constrainHead(i, k, l):
-            # get idb k
-            idb = self.idToRel(k)
-            arrPrev = idbArr[idb][l - 1]
-            arrNext = idbArr[idb][l]
-
-            print "idb", idb
-            print "arrPrev", arrPrev
-            print "arrNext", arrNext
-
-            consts = []
-            tupleType = tup[idb]
-
-            headTuple = frameArgs[l][0:idb.arity]
-            headTuple = tupleType.tuple(*headTuple)
-
-            # assert that fact not true at l-1
-            consts.append(Not(Select(arrPrev, headTuple)))
-
-            # assert that at frame l, everything is same as l-1 except headTuple,
-            # it is now True.
-            consts.append(arrNext == Update(arrPrev, headTuple, True))
-
-            # constrains all relations that did not change
-            # in rule application
-            for i in idbArr:
-                if i is not idb:
-                    frame = idbArr[i][l - 1] == idbArr[i][l]
-                    consts.append(frame)
-
-            print "head consts", consts
-            return And(*consts)
-
-        # constrain body pos in clause i assuming its set to IDB/EDB k
-        # at frame l
-        def constrainBody(i, pos, k, l):
-            # get rel k
-            rel = self.idToRel(k)
-
-            if rel in idbArr:
-                arrPrev = idbArr[rel][l - 1]
-            else:
-                assert(rel in edbArr)
-                arrPrev = edbArr[rel]
+        # initializing IDB -- where all facts are negative
+        for r in self.orels:
+            # go thru all possible combinations
+            for t in product(range(1, self.domain), repeat=r.arity):
+                tp = mkTuple(tup[r], t)
+                arr = idbArr[r][0]
+                initConsts.append(Not(Select(arr, tp)))
 
-            # where the body rel args begin and end
-            begin = self.na + pos * self.na
-            end = begin + rel.arity
+        return initConsts
 
-            print "b", begin
-            print "e", end
+    """ the EDB arrays hold exactly the facts """
 
-            tupleType = tup[rel]
-            headTuple = frameArgs[l][begin:end]
-            print frameArgs[l]
-            print headTuple
-            print rel
-            print tupleType
-            headTuple = tupleType.tuple(*headTuple)
-            print headTuple
+    def createEdbConsts(self):
+        edbArr = self.edbArr
+        edbFacts = self.edbFacts
+        tup = self.tup
 
-            res = Select(arrPrev, headTuple)
+        # go thru facts and encode them as array constraints
+        initConsts = []
+        for (r, t) in self.edb.pairs():
+            arr = edbArr[r]
+            initConsts.append(Select(arr, mkTuple(tup[r], t)))
 
-            return res
+        # go thru frame (all not facts) and negate them
+        for r in self.edb.irels:
 
-        def getClauseArgs(i):
-            h = self.heads[i]
-            args = self.argvars[h]
+            # go thru all possible combinations
+            for t in product(range(1, self.domain), repeat=r.arity):
 
-            for b in self.bodies[i]:
-                args = args + self.argvars[b]
+                # if r(t) is a fact, skip it
+                if t in edbFacts[r]:
+                    continue
 
-            return args
+                tp = mkTuple(tup[r], t)
+                arr = edbArr[r]
+                initConsts.append(Not(Select(arr, tp)))
 
-        def matchLatches(i, l):
-            args = frameArgs[l]
-            cargs = getClauseArgs(i)
+        return initConsts
 
-            const = []
-            assert (len(args) == len(cargs))
+    """ tuples of r over the domain """
 
-            for i1, c1 in enumerate(cargs):
-                for i2, c2 in enumerate(cargs):
-                    if i1 == i2:
-                        continue
+    def domainTuples(self, r):
+        return product(range(1, self.domain), repeat=r.arity)
 
-                    phi = Implies(c1 == c2, args[i1] == args[i2])
-                    const.append(phi)
+    """ IDB relation r at frame l as a trace: the entries of frame l-1
+        and (D, head latches of frame l), where D holds iff the clause
+        applied in frame l derives a fact of r (see insert) """
 
-            return And(*const)
+    def extendTrace(self, r, l):
+        d = Bool("D" + str(l) + "-" + r.name)
+        return self.idbArr[r][l - 1] + [(d, self.frameArgs[l][0:r.arity])]
 
-        # apply clause i at level l
-        def applyClause(i, l):
-            n = len(self.edb.irels)
-            m = n + len(self.orels)
+    """ Boolean variables name(t) for every tuple t of r """
 
-            headConsts = []
-            bodyConsts = []
-            h = self.heads[i]
-            bs = self.bodies[i]
+    def mkBoolRel(self, r, name):
+        rel = {}
+        for t in self.domainTuples(r):
+            rel[t] = Bool(name + "(" + ",".join(map(str, t)) + ")")
+        return rel
 
-            for k in range(n + 1, m + 1):
-                lhs = h == k
-                rhs = constrainHead(i, k, l)
-                print "constrainHead", rhs
-                headConsts.append(Implies(lhs, rhs))
+    """ frame 0 of the Boolean relations: EDB tuples are true exactly
+        for the facts, IDB tuples are false; these are constants, so
+        no constraints are needed """
 
-            for pos, b in enumerate(bs):
-                for k in range(1, m + 1):
-                    lhs = b == k
-                    rhs = constrainBody(i, pos, k, l)
-                    bodyConsts.append(Implies(lhs, rhs))
+    def createInitBools(self):
+        for r in self.edb.irels:
+            self.edbArr[r] = {}
+            self.edbFacts[r] = self.edb.tuples(r)
+            if self.closedWorld == "sparse":
+                self.factList[r] = sorted(self.edbFacts[r])
+            for t in self.domainTuples(r):
+                self.edbArr[r][t] = BoolVal(t in self.edbFacts[r])
 
-            print "bodyConsts", bodyConsts
+        for r in self.orels:
+            rel = {}
+            for t in self.domainTuples(r):
+                rel[t] = BoolVal(False)
+            self.idbArr[r] = [rel]
 
-            # this connects args "af*-*" with
-            # the chosen clause arguments
-            latches = matchLatches(i, l)
+        return []
 
-            return And(And(*headConsts), And(*bodyConsts), latches)
+    # the following operate on relations of either kind, see relations
 
-        # get constrains for rule app at level l
-        def getFrame(l):
-            consts = []
+    """ tuple args (constants or latches) of r is in arr """
 
-            # integer indicating clause to apply
-            S = Int('S' + str(l))
+    def select(self, arr, r, args):
+        if self.closedWorld == "sparse" and r in self.edbFacts:
+            return self.selectFact(r, args)
 
-            ruleArgs.append(S)
+        if self.relations == "trace" and r in self.idbArr:
+            disj = map(lambda (d, t): And(d, self.tupleEq(args, t)), arr)
+            if disj == []:
+                return BoolVal(False)
+            return Or(*disj)
 
-            consts.append(S >= 1)
-            consts.append(S <= self.nc)
+        # arrays, and EDB relations of traces
+        if self.relations in ["array", "trace"]:
+            return Select(arr, mkTuple(self.tup[r], args))
 
-            for i in range(1, self.nc + 1):
-                consts.append(Implies(S == i, applyClause(i, l)))
+        if all(map(lambda a: isinstance(a, (int, long)), args)):
+            return arr[tuple(args)]
 
-            print "Constraint at frame", l, consts
+        disj = []
+        for t in self.domainTuples(r):
+            if is_false(arr[t]):
+                continue
+            disj.append(And(self.tupleEq(args, t), arr[t]))
+        return Or(*disj)
 
-            return And(*consts)
+    """ tuple args of EDB relation r is a fact """
 
-        def getCorrectness():
-            pos = []
-            neg = []
-            for p in self.pfacts:
-                t = factToZ3Tuple(p)
-                arr = idbArr[p.rel][self.bound]
-                pos.append(Select(arr, t))
+    def selectFact(self, r, args):
+        if all(map(lambda a: isinstance(a, (int, long)), args)):
+            return BoolVal(tuple(args) in self.edbFacts[r])
 
-            for p in self.nfacts:
-                t = factToZ3Tuple(p)
-                arr = idbArr[p.rel][self.bound]
-                neg.append(Not(Select(arr, t)))
+        disj = map(lambda t: self.tupleEq(args, t), self.factList[r])
+        if disj == []:
+            return BoolVal(False)
+        return Or(*disj)
 
-            return (pos,neg)
+    def tupleEq(self, args, t):
+        return And(*map(lambda (a, c): a == c, zip(args, t)))
 
-        def getApplyAll():
-            conj = []
+    """ arrNext is arrPrev plus tuple args of r """
 
-            for i in range(1, self.nc+1):
-                disj = []
+    def insert(self, arrPrev, arrNext, r, args):
+        if self.relations == "array":
+            return arrNext == Update(arrPrev, mkTuple(self.tup[r], args), True)
+
+        # the new entry of the trace is a fact of r
+        if self.relations == "trace":
+            return arrNext[-1][0]
+
+        consts = []
+        for t in self.domainTuples(r):
+            consts.append(arrNext[t] == Or(arrPrev[t], self.tupleEq(args, t)))
+        return And(*consts)
 
-                for s in ruleArgs:
-                    disj.append (s == i)
+    def sameRel(self, arr1, arr2, r):
+        if self.relations == "array":
+            return arr1 == arr2
 
-                conj.append(Or(*disj))
+        # the new entry of the trace is no fact of r
+        if self.relations == "trace":
+            return Not(arr2[-1][0])
 
-            return And(*conj)
+        return And(*map(lambda t: arr1[t] == arr2[t], self.domainTuples(r)))
 
-        def getDerivSymmetry():
-            res = []
-            for i,s in enumerate(ruleArgs[:-1]):
-                imp = Implies(s > self.base, ruleArgs[i+1] > self.base)
-                res.append(imp)
+    # constrain head i assuming its set to IDB k
+    # at frame l
+    def constrainHead(self, i, k, l):
+        idbArr = self.idbArr
 
-            return And(*res)
+        # get idb k
+        idb = self.idToRel(k)
+        arrPrev = idbArr[idb][l - 1]
+        arrNext = idbArr[idb][l]
 
-        edbArr = {}
-        edbFacts = {}
+        log.debug("idb %s", idb)
+        log.debug("arrPrev %s", arrPrev)
+        log.debug("arrNext %s", arrNext)
 
-        tup = {}
+        consts = []
 
-        idbArr = {}
+        headTuple = self.frameArgs[l][0:idb.arity]
 
-        initConsts = createInitConsts()
-        createIdbArrays()
+        # assert that fact not true at l-1
+        consts.append(Not(self.select(arrPrev, idb, headTuple)))
 
-        print "idbArr", idbArr
-        print "tup", tup
+        # assert that at frame l, everything is same as l-1 except headTuple,
+        # it is now True.
+        consts.append(self.insert(arrPrev, arrNext, idb, headTuple))
 
-        frames = []
-        frameArgs = {}
+        # constrains all relations that did not change
+        # in rule application
+        for i in idbArr:
+            if i is not idb:
+                frame = self.sameRel(idbArr[i][l - 1], idbArr[i][l], i)
+                consts.append(frame)
+
+        log.debug("head consts %s", consts)
+        return And(*consts)
+
+    # constrain body pos in clause i assuming its set to IDB/EDB k
+    # at frame l
+    def constrainBody(self, i, pos, k, l):
+        # get rel k
+        rel = self.idToRel(k)
+
+        if rel in self.idbArr:
+            arrPrev = self.idbArr[rel][l - 1]
+        else:
+            assert(rel in self.edbArr)
+            arrPrev = self.edbArr[rel]
 
-        ruleArgs = []
+        # where the body rel args begin and end
+        begin = self.na + pos * self.na
+        end = begin + rel.arity
+
+        log.debug("b %s", begin)
+        log.debug("e %s", end)
+
+        headTuple = self.frameArgs[l][begin:end]
+        log.debug("%s", self.frameArgs[l])
+        log.debug("%s", headTuple)
+        log.debug("%s", rel)
+
+        res = self.select(arrPrev, rel, headTuple)
+
+        return res
+
+    def getClauseArgs(self, i):
+        h = self.heads[i]
+        args = self.argvars[h]
+
+        for b in self.bodies[i]:
+            args = args + self.argvars[b]
+
+        return args
+
+    def matchLatches(self, i, l):
+        args = self.frameArgs[l]
+
+        const = []
+        assert (len(args) == len(self.getClauseArgs(i)))
+
+        for (i1, i2) in combinations(range(0, len(args)), 2):
+            phi = Implies(self.argEqs[(i, i1, i2)], args[i1] == args[i2])
+            const.append(phi)
+
+        return And(*const)
+
+    # apply clause i at level l
+    def applyClause(self, i, l):
+        n = len(self.edb.irels)
+        m = n + len(self.orels)
+
+        headConsts = []
+        bodyConsts = []
+        h = self.heads[i]
+        bs = self.bodies[i]
+
+        for k in range(n + 1, m + 1):
+            lhs = h == k
+            rhs = self.constrainHead(i, k, l)
+            log.debug("constrainHead %s", rhs)
+            headConsts.append(Implies(lhs, rhs))
+
+        for pos, b in enumerate(bs):
+            for k in range(1, m + 1):
+                lhs = b == k
+                rhs = self.constrainBody(i, pos, k, l)
+                bodyConsts.append(Implies(lhs, rhs))
+
+        log.debug("bodyConsts %s", bodyConsts)
+
+        # this connects args "af*-*" with
+        # the chosen clause arguments
+        latches = self.matchLatches(i, l)
+
+        return And(And(*headConsts), And(*bodyConsts), latches)
+
+    # get constrains for rule app at level l
+    def getFrame(self, l):
+        consts = []
+
+        # integer indicating clause to apply
+        S = self.mkVar('S' + str(l), self.nc)
+
+        self.ruleArgs.append(S)
+
+        consts.append(self.atLeast(S, 1))
+        consts.append(self.atMost(S, self.nc))
+
+        for i in range(1, self.nc + 1):
+            consts.append(Implies(S == i, self.applyClause(i, l)))
+
+        log.debug("Constraint at frame %s %s", l, consts)
+
+        return And(*consts)
+
+    """ adds frame l (after frames 0..l-1) to the simulation and returns
+        its constraint; frames do not depend on the bound, so a bound
+        can be extended by adding frames """
+
+    def addFrame(self, l):
+        assert(len(self.ruleArgs) == l - 1)
 
         # generate variables for all arities
         argWidth = self.na * (self.nl + 1)
-        print "wdit" , argWidth
-        print self.na
-        for i in range(1, self.bound + 1):
-            print "DOING FRAME", i
-            # create frame variables denoting latches
-            args = []
-            argsConst = []
-            for j in range(1, argWidth + 1):
-                arg = Int("af" + str(i) + "-" + str(j))
-                args.append(arg)
-                argsConst.append(And(arg >= 1, arg <= self.domain - 1))
+        log.debug("DOING FRAME %s", l)
+        # create frame variables denoting latches
+        args = []
+        argsConst = []
+        for j in range(1, argWidth + 1):
+            arg = self.mkVar("af" + str(l) + "-" + str(j), self.domain - 1)
+            args.append(arg)
+            argsConst.append(self.inRange(arg, 1, self.domain - 1))
 
-            # latches for frame i
-            frameArgs[i] = args
+        # latches for frame l
+        self.frameArgs[l] = args
 
-            # get frame constraint
-            frames.append(And(getFrame(i), And(*argsConst)))
+        self.createIdbArrays(l)
 
-        symmetry = getDerivSymmetry()
-        frames = And(*frames)
-        initConsts = And(*initConsts)
-        (pos,neg) = getCorrectness()
+        # get frame constraint
+        return And(self.getFrame(l), And(*argsConst))
 
+    """ examples checked at frame k """
 
-        applyAll = getApplyAll()
-        print "applyAll", applyAll
+    def getCorrectness(self, k):
+        pos = []
+        neg = []
+        for p in self.pfacts:
+            arr = self.idbArr[p.rel][k]
+            pos.append(self.select(arr, p.rel, p.ftuple))
 
-        #print "Correctness", correctness
-        # exit(1)
-        return (And(initConsts, frames, And(*neg), applyAll, symmetry), pos)
+        for p in self.nfacts:
+            arr = self.idbArr[p.rel][k]
+            neg.append(Not(self.select(arr, p.rel, p.ftuple)))
+
+        return (pos,neg)
+
+    """ every clause is applied in one of the first k frames """
+
+    def getApplyAll(self, k):
+        conj = []
+
+        for i in range(1, self.nc+1):
+            disj = []
+
+            for s in self.ruleArgs[0:k]:
+                disj.append (s == i)
+
+            conj.append(Or(*disj))
+
+        return And(*conj)
+
+    """ base cases are applied before all other clauses in the
+        first k frames """
+
+    def getDerivSymmetry(self, k):
+        res = []
+        ruleArgs = self.ruleArgs[0:k]
+        for i in range(1, len(ruleArgs)):
+            res.append(self.getFrameOrder(i))
 
-    # encodes variables in vs as their equivalence classes per model
-    def getEquivClasses(self, model, vs):
+        return And(*res)
+
+    """ the clause applied in frame l+1 is no base case if the one of
+        frame l is none """
+
+    def getFrameOrder(self, l):
+        s = self.ruleArgs[l - 1]
+        t = self.ruleArgs[l]
+        return Implies(self.above(s, self.base), self.above(t, self.base))
+
+    # encodes variables in vs as their equivalence classes per model;
+    # if ws is given, the classes of vs are imposed on the
+    # corresponding variables of ws instead
+    def getEquivClasses(self, model, vs, ws=None):
         eq = {}
         consts = []
 
-        print "EQ vs", vs
-        for v in vs:
+        if ws is None:
+            ws = vs
+
+        log.debug("EQ vs %s", vs)
+        for v, w in zip(vs, ws):
             if model[v].as_long() not in eq:
-                eq[model[v].as_long()] = [v]
+                eq[model[v].as_long()] = [w]
                 continue
 
-            eq[model[v].as_long()].append(v)
+            eq[model[v].as_long()].append(w)
 
-        print eq
+        log.debug("%s", eq)
         for k in eq:
             for i in range(0, len(eq[k]) - 1):
                 consts.append(eq[k][i] == eq[k][i + 1])
 
         for k1 in eq:
             for k2 in eq:
-                print k1, k2
                 if k1 == k2:
                     continue
-                print "here"
                 consts.append(eq[k1][0] != eq[k2][0])
 
-        print "Equiv repr, ", consts
+        log.debug("Equiv repr, %s", consts)
         # exit(1)
         return And(*consts)
 
@@ -857,10 +1621,90 @@ class STask:
 
             # exit(1)
             const = const + rels + [equiv]
-        print "model repr, ", const
+        log.debug("model repr, %s", const)
         # exit(1)
         return And(*const)
 
+    """ clause slot j is syntactically the clause in slot i of model with
+        its body literals permuted by perm: same relations in the same
+        positions and same argument equivalence classes """
+
+    def matchClause(self, model, i, j, perm):
+        const = [self.heads[j] == model[self.heads[i]]]
+
+        vs = self.argvars[self.heads[i]]
+        ws = self.argvars[self.heads[j]]
+
+        for k, bj in enumerate(self.bodies[j]):
+            bi = self.bodies[i][perm[k]]
+            const.append(bj == model[bi])
+            vs = vs + self.argvars[bi]
+            ws = ws + self.argvars[bj]
+
+        const.append(self.getEquivClasses(model, vs, ws))
+
+        return And(*const)
+
+    """ some slot of the program holds clause i of model, up to the
+        order of its body literals """
+
+    def containsClause(self, model, i):
+        disj = []
+        for j in range(1, self.nc + 1):
+            for perm in self.bodyPerms(model, i):
+                disj.append(self.matchClause(model, i, j, perm))
+        return Or(*disj)
+
+    """ orders of the body literals of clause i of model; literals with
+        the same relation and arguments are not permuted, and only the
+        given order is used above MAX_PERM_LITS literals """
+
+    def bodyPerms(self, model, i):
+        # relation and argument positions of the literal of variable b
+        def litKey(b):
+            r = model[b].as_long()
+            args = self.argvars[b][0:self.arities[r]]
+            return (r,) + tuple([model[a].as_long() for a in args])
+
+        if self.nl > MAX_PERM_LITS:
+            return [range(0, self.nl)]
+
+        perms = []
+        seen = set()
+        bs = self.bodies[i]
+        for perm in permutations(range(0, self.nl)):
+            key = tuple([litKey(bs[k]) for k in perm])
+            if key in seen:
+                continue
+            seen.add(key)
+            perms.append(perm)
+        return perms
+
+    """ generalizes a counterexample to a constraint excluding every
+        candidate that fails for the same reason as model:
+        a negative fact derived using clauses C is derived by any program
+        containing C; a positive fact missing from program P is missing
+        from any program built only from clauses of P """
+
+    def blockCounterexample(self, model, cex):
+        if cex.positive:
+            const = []
+            for j in range(1, self.nc + 1):
+                disj = []
+                for i in range(1, self.nc + 1):
+                    for perm in self.bodyPerms(model, i):
+                        disj.append(self.matchClause(model, i, j, perm))
+                const.append(Or(*disj))
+            return Not(And(*const))
+
+        if cex.derivation is None:
+            # no proof available: all clauses may have been used
+            used = range(1, self.nc + 1)
+        else:
+            used = map(lambda ci: ci + 1, cex.used())
+
+        return Not(And(*[self.containsClause(model, i) for i in used]))
+
     def getArgEqModel(self, model):
         modelF = []
 
@@ -880,8 +1724,7 @@ class STask:
                         modelFi.append(v1 == v2)
                     else:
                         modelFi.append(Not(v1 == v2))
-            print i, modelFi
-            print "\n"
+            log.debug("%s %s", i, modelFi)
             modelF = modelF + modelFi
 
         assert(is_true(model.eval(And(*modelF))))
@@ -919,6 +1762,20 @@ class STask:
         # of literals
         stats.append(self.nl)
 
+        # encoding construction time
+        enc = 0
+        for p in ["vars", "simulation", "shape", "soft", "load", "assert"]:
+            enc = enc + self.prof.time(p)
+        stats.append("%.2f" % enc)
+
+        # verification time
+        stats.append("%.2f" % self.prof.time("verify"))
+
+        # blocking clause construction time
+        stats.append("%.2f" % self.prof.time("block"))
+
+        # of asserted constraints
+        stats.append(self.prof.counts.get("asserts", 0))
 
         return stats
 
@@ -929,7 +1786,11 @@ class STask:
 
         return And(*c)
 
-    def synthesize(self, nc, nl, bound):
+    """ creates the head, body and argument variables of a program with
+        nc clauses of nl body literals each and returns their domain
+        constraints """
+
+    def createVars(self, nc, nl):
         # number of clauses
         self.nc = nc
 
@@ -939,13 +1800,10 @@ class STask:
         # max relation arity
         self.na = self.getMaxArity()
 
-        # bound on simulation
-        self.bound = bound
-
         allvars = set()
 
-        def intVar(s):
-            v = Int(s)
+        def intVar(s, hi):
+            v = self.mkVar(s, hi)
             allvars.add(v)
             return v
 
@@ -960,11 +1818,11 @@ class STask:
         n = len(self.edb.irels)
         m = n + len(self.orels)
 
-        print "n = ", n
-        print "m = ", m
+        log.debug("n = %s", n)
+        log.debug("m = %s", m)
 
         for i in range(1,n+1):
-            print i, self.idToRel(i)
+            log.debug("%s %s", i, self.idToRel(i))
 
 
         #exit(1)
@@ -973,17 +1831,17 @@ class STask:
 
         # create head and body literal variables
         for i in range(1, nc + 1):
-            print "********bodiesConst", bodiesConst
-            heads[i] = intVar('H' + str(i))
-            print heads[i]
-            headsConst.append(And(heads[i] >= n + 1, heads[i] <= m))
+            log.debug("********bodiesConst %s", bodiesConst)
+            heads[i] = intVar('H' + str(i), m)
+            log.debug("%s", heads[i])
+            headsConst.append(self.inRange(heads[i], n + 1, m))
 
             # for every head, there are nl bodies
             bi = []
             for j in range(1, nl + 1):
-                bv = intVar('B' + str(i) + "-" + str(j))
+                bv = intVar('B' + str(i) + "-" + str(j), m)
                 bi.append(bv)
-                bodiesConst.append(And(bv >= 1, bv <= m))
+                bodiesConst.append(self.inRange(bv, 1, m))
                 if self.andersen:
                     # HACK: Andersen 4 constraints
                     if i == 1:
@@ -1012,7 +1870,7 @@ class STask:
 
 
             bodies[i] = bi
-            print bodies[i]
+            log.debug("%s", bodies[i])
 
         #print "---------------------"
         #for b in bodiesConst: print b
@@ -1020,8 +1878,8 @@ class STask:
         argvars = {}
         argvarsset = set()
 
-        print "Head vars", heads
-        print "Body vars", bodies
+        log.debug("Head vars %s", heads)
+        log.debug("Body vars %s", bodies)
 
         argWidth = self.na * (self.nl + 1)
 
@@ -1034,9 +1892,9 @@ class STask:
 
             # generate variables for all arities
             for j in range(1, self.na + 1):
-                h = intVar('h' + str(i) + "-" + str(j))
+                h = intVar('h' + str(i) + "-" + str(j), argWidth)
                 hvars.append(h)
-                argsConst.append(And(h >= 1, h <= argWidth))
+                argsConst.append(self.inRange(h, 1, argWidth))
 
                 # #####TEST
                 # if j == 1:
@@ -1050,9 +1908,10 @@ class STask:
             for j in range(1, nl + 1):
                 bvars = []
                 for k in range(1, self.na + 1):
-                    b = intVar('b' + str(i) + "-" + str(j) + "-" + str(k))
+                    b = intVar('b' + str(i) + "-" + str(j) + "-" + str(k),
+                               argWidth)
                     bvars.append(b)
-                    argsConst.append(And(b >= 1, b <= argWidth))
+                    argsConst.append(self.inRange(b, 1, argWidth))
 
                     # TEST
                     # if i == 1 and k == 1:
@@ -1072,14 +1931,14 @@ class STask:
 
         aset = []
         amap = []
-        for i,r in enumerate(self.edb.irels + self.orels):
+        for i,r in enumerate(self.rels):
             if r.arity < self.na:
                 addArityConsts= True
                 aset.append((i+1,r.arity))
 
 
 
-        print addArityConsts
+        log.debug("%s", addArityConsts)
 
         arityConsts = []
 
@@ -1091,36 +1950,48 @@ class STask:
                     const.append(Implies(p==i, self.equal(pvars[r-1:self.na])))
                 arityConsts.append(And(*const))
 
-        print arityConsts
-        print self.idToRel(1)
-        print self.idToRel(2)
+        log.debug("%s", arityConsts)
+        log.debug("%s", self.idToRel(1))
+        log.debug("%s", self.idToRel(2))
 
         arityConsts = And(*arityConsts)
 
 
 
-        print "\n"
-        print "Heads constraints", headsConst
-        print "Bodies constraints", bodiesConst
-        print "Arguments constraints", argsConst
+        log.debug("Heads constraints %s", headsConst)
+        log.debug("Bodies constraints %s", bodiesConst)
+        log.debug("Arguments constraints %s", argsConst)
 
         self.heads = heads
         self.bodies = bodies
         self.argvars = argvars
 
+        # the equality pattern of the arguments of each clause: one
+        # Boolean per pair of positions, shared by all frames (see
+        # matchLatches)
+        self.argEqs = {}
+        for i in range(1, nc + 1):
+            cargs = self.getClauseArgs(i)
+            for (i1, i2) in combinations(range(0, len(cargs)), 2):
+                e = Bool("e" + str(i) + "-" + str(i1) + "-" + str(i2))
+                self.argEqs[(i, i1, i2)] = e
+                argsConst.append(e == (cargs[i1] == cargs[i2]))
+
         headsConst = And(*headsConst)
         bodiesConst = And(*bodiesConst)
         argsConst = And(*argsConst)
 
-        # get simulation constraint
-        (simulation,pos) = self.simulation()
-        print simulation
+        return (headsConst, bodiesConst, arityConsts, argsConst)
+
+    """ constraints on the shape of the clauses: chain rule,
+        connectedness, base and recursive cases """
 
+    def getShape(self):
         # get symmetry constraint
         symmetry = True
         #if not self.chain:
         #    symmetry = self.getSymmetry()
-        print self.argvars
+        log.debug("%s", self.argvars)
 
         equality = True
         chain = True
@@ -1142,6 +2013,10 @@ class STask:
             #print simplify(chain)
             #exit(1)
 
+        # symmetry breaking is part of the shape
+        if self.symmetry:
+            equality = And(equality, self.getSymmetryBreaking())
+
         # enforce equality -- weaker than chain
 
         for i in range(1, self.nc+1):
@@ -1162,59 +2037,407 @@ class STask:
         # print "nb", nonbase
         # exit(1)
 
-        if self.soft:
-            softC = self.getSoft()
-        else:
-            softC = []
+        return (chain, base, nonbase, equality)
+
+    def synthesize(self, nc, nl, bound):
+        if self.resultCache is not None:
+            res = self.cachedResult(nc, nl, bound)
+            if res is not None:
+                return res
+
+        enc = None
+        if self.encodingCache is not None:
+            enc = self.loadEncoding(nc, nl, bound)
+        fresh = enc is None
+        if fresh:
+            enc = self.encode(nc, nl, bound)
+        (const, pos, softC, acts) = enc
+
+        # in incremental mode the encoding is asserted once and
+        # every iteration only adds the newest blocking clause
+        solver = None
+        if self.incremental or acts != []:
+            solver = self.mkSolver(const, pos, softC)
+
+        self.core = None
+        res = self.cegis(const, pos, softC, solver, acts)
+        if res == False and self.core is not None:
+            log.info("unsat core: %s", ", ".join(self.coreNames()))
+
+        # stored only once the solve is over: building the solvers that
+        # print the encoding perturbs z3's state and with it the search
+        if fresh and self.encodingCache is not None:
+            self.storeEncoding(nc, nl, bound, *enc)
+        if res != False and self.resultCache is not None:
+            self.storeResult(nc, nl, bound, res)
+        return res
+
+    """ the constraint of nc clauses of nl literals with the given bound,
+        the positive facts, the soft constraints and the assumptions
+        naming the constraint groups (see explain) """
+
+    def encode(self, nc, nl, bound):
+        with self.prof.phase("vars"):
+            (headsConst, bodiesConst, arityConsts, argsConst) = self.createVars(nc, nl)
+
+        # bound on simulation
+        self.bound = bound
+
+        # get simulation constraint
+        with self.prof.phase("simulation"):
+            (simulation,pos) = self.simulation()
+        log.debug("%s", simulation)
+
+        with self.prof.phase("shape"):
+            (chain, base, nonbase, equality) = self.getShape()
+
+        with self.prof.phase("soft"):
+            softC = self.getObjective()
 
-        softC = softC
         #pos = []
         # exit(1)
-        # solve verify loop
 
-        print symmetry
         const = And(headsConst, bodiesConst, arityConsts, argsConst, chain, base, nonbase, simulation, equality)
 
         # TEST
         #const = And(const, self.bodies[1][0] == 1, self.bodies[1][1] == 1)
         #const = And(const, self.bodies[2][0] == 1, self.bodies[2][1] == 2)
 
-        i = 1
+        if not self.explain:
+            return (const, pos, softC, [])
+
+        (const, acts) = self.nameGroups(
+            [("heads", headsConst), ("bodies", bodiesConst),
+             ("arity", arityConsts), ("args", argsConst),
+             ("chain", chain), ("base", base), ("nonbase", nonbase),
+             ("simulation", simulation), ("shape", equality)] +
+            [("pos:" + str(p), c) for (p, c) in zip(self.pfacts, pos)])
+        return (const, [], softC, acts)
+
+    """ files of the encoding of a synthesize call: the hard constraints
+        as SMT-LIB2 (positive facts last), the soft constraints as
+        SMT-LIB2 assertions, and a JSON map of the variables modelToClause
+        reads """
+
+    def encodingPaths(self, nc, nl, bound):
+        key = self.fingerprint(nc, nl, bound)
+        if self.explain:
+            key = key + "-explain"
+        base = os.path.join(self.encodingCache, key)
+        return (base + ".smt2", base + "-soft.smt2", base + ".json")
+
+    def storeEncoding(self, nc, nl, bound, const, pos, softC, acts):
+        def var(v):
+            if is_bv(v):
+                return [str(v), v.size()]
+            return [str(v), 0]
+
+        vs = {"nc": self.nc, "nl": self.nl, "na": self.na, "pos": len(pos),
+              "assumptions": map(str, acts),
+              "heads": dict((i, var(h)) for (i, h) in self.heads.items()),
+              "bodies": dict((i, map(var, bs)) for (i, bs) in self.bodies.items()),
+              "argvars": dict((str(v), map(var, a)) for (v, a) in self.argvars.items())}
+
+        hard = Solver()
+        hard.add(const)
+        for p in pos:
+            hard.add(p)
+        soft = Solver()
+        for c in softC:
+            soft.add(c)
+
+        # the map is written last: readers only use complete encodings
+        paths = self.encodingPaths(nc, nl, bound)
+        for (path, text) in zip(paths, [hard.sexpr(), soft.sexpr(), json.dumps(vs) + "\n"]):
+            writeAtomic(path, text)
+        log.info("stored encoding %s", paths[0])
+
+    """ the encoding of a synthesize call as stored by storeEncoding,
+        None if there is none """
+
+    def loadEncoding(self, nc, nl, bound):
+        (hardPath, softPath, mapPath) = self.encodingPaths(nc, nl, bound)
+        if not os.path.exists(mapPath):
+            return None
+
+        with self.prof.phase("load"):
+            with open(mapPath) as f:
+                vs = json.load(f)
+
+            consts = {}
+            def var(v):
+                (name, bits) = v
+                if name not in consts:
+                    if bits == 0:
+                        consts[name] = Int(str(name))
+                    else:
+                        consts[name] = BitVec(str(name), bits)
+                return consts[name]
+
+            self.nc = vs["nc"]
+            self.nl = vs["nl"]
+            self.na = vs["na"]
+            self.bound = bound
+            self.heads = dict((int(i), var(h)) for (i, h) in vs["heads"].items())
+            self.bodies = dict((int(i), map(var, bs)) for (i, bs) in vs["bodies"].items())
+            self.argvars = {}
+            for v in self.heads.values() + sum(self.bodies.values(), []):
+                self.argvars[v] = map(var, vs["argvars"][str(v)])
+
+            hard = parse_smt2_file(hardPath)
+            n = len(hard) - vs["pos"]
+            const = And(*[hard[j] for j in range(0, n)])
+            pos = [hard[j] for j in range(n, len(hard))]
+            softC = [c for c in parse_smt2_file(softPath)]
+            acts = map(lambda a: Bool(str(a)), vs["assumptions"])
+
+        log.info("loaded encoding %s", hardPath)
+        return (const, pos, softC, acts)
+
+    """ guards each (name, constraint) of groups by an assumption of that
+        name; returns the guarded constraints and the assumptions """
+
+    def nameGroups(self, groups):
+        conj = []
+        acts = []
+        for (name, c) in groups:
+            act = Bool(name)
+            conj.append(Implies(act, c))
+            acts.append(act)
+
+        return (And(*conj), acts)
+
+    """ names of the assumptions in the last unsat core """
+
+    def coreNames(self):
+        if self.core is None:
+            return []
+        return [str(c) for c in self.core]
+
+    """ solve verify loop; candidates come from solver if given (with
+        assumptions), otherwise from a fresh solver for const and pos """
+
+    def cegis(self, const, pos, softC, solver=None, assumptions=[]):
+        # batch mode verifies candidates in child processes while the
+        # solver looks for the next ones
+        with self.verifiers():
+            assert(self.pool is None or solver is not None)
+            return self.cegisLoop(const, pos, softC, solver, assumptions, self.pool)
+
+    """ in batch mode, the pool of processes verifying candidates while
+        inside; a pool already set up (e.g. by autoSynthesize, for all
+        the cegis calls of its search) is kept """
+
+    @contextmanager
+    def verifiers(self):
+        if self.batch <= 1 or self.pool is not None:
+            yield
+            return
+
+        # verification only reads the EDB and the examples, so the
+        # children's copy of the task stays valid across sizes
+        global verifying
+        verifying = self
+        self.pool = Pool(self.jobs)
+        try:
+            yield
+        finally:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+    def cegisLoop(self, const, pos, softC, solver, assumptions, pool):
         while True:
-            print "Iteration: ", i
-
-            (clauses, model) = self.solveConst(const, pos, softC)
-            print "Clauses: "
-            for c in clauses:
-                print c
-            print "\n"
+            # iterations are counted across calls (see autoSynthesize)
+            self.iters = self.iters + 1
+            i = self.iters
+            log.info("Iteration: %s", i)
+
+            solveTime = self.time
+            if pool is not None:
+                cands = self.solveBatch(solver, assumptions, pool)
+            elif solver is not None:
+                cands = [self.checkSolver(solver, assumptions) + (None,)]
+            else:
+                cands = [self.solveConst(const, pos, softC) + (None,)]
+            solveTime = self.time - solveTime
             #raw_input()
 
-            if clauses == None:
-                print "no solution exists"
+            if cands[0][0] == None:
+                self.prof.iteration(i, {"solve": solveTime})
+                log.info("no solution exists")
                 return False
-            if self.verify(clauses):
-                print "Success!"
-                print "Interation:", i
+
+            start = timer()
+            cexs = []
+            for (clauses, model, job) in cands:
+                log.debug("Clauses: %s", clauses)
+                if job is None:
+                    cex = self.checkCandidate(clauses)
+                else:
+                    cex = job.get()
+                    self.recordOutcome(programKey(clauses), cex)
+                cexs.append(cex)
+            verifyTime = timer() - start
+            self.prof.add("verify", verifyTime)
+
+            if None in cexs:
+                clauses = cands[cexs.index(None)][0]
+                self.prof.iteration(i, {"solve": solveTime, "verify": verifyTime})
+                log.info("Success!")
+                log.info("Interation: %s", i)
                 for c in clauses:
-                    print c
+                    log.info("%s", c)
 
-                print "SOLVING TIME: ", self.time
+                log.info("SOLVING TIME: %s", self.time)
 
                 # TEST
                 #phi = model.eval(simulation)
                 # solve(phi)
+                self.clauses = clauses
                 s = self.stats(i)
                 return s
-            else:
-                modelF = self.negateModel(model)
 
-                negModel = Not(modelF)
+            start = timer()
+            for ((clauses, model, job), cex) in zip(cands, cexs):
+                log.info("Counterexample %s", cex)
+                if self.generalize:
+                    negModel = self.blockCounterexample(model, cex)
+                else:
+                    negModel = Not(self.negateModel(model))
+                self.prof.count("blocks")
+
+                log.debug("%s", negModel)
+                if solver is not None:
+                    solver.add(negModel)
+                else:
+                    const = And(const, negModel)
+            blockTime = timer() - start
+            self.prof.add("block", blockTime)
+            self.prof.iteration(i, {"solve": solveTime, "verify": verifyTime,
+                                    "block": blockTime})
+
+    """ up to batch distinct candidates of solver; each is handed to pool
+        for verification as soon as it is found (unless its outcome is
+        cached) and excluded from the solver for the rest of the round """
+
+    def solveBatch(self, solver, assumptions, pool):
+        cands = []
+        solver.push()
+        for j in range(0, self.batch):
+            (clauses, model) = self.checkSolver(solver, assumptions)
+            if clauses is None:
+                break
+
+            job = None
+            if programKey(clauses) not in self.outcomes:
+                job = pool.apply_async(verifyInChild, (clauses,))
+            cands.append((clauses, model, job))
+
+            solver.add(Not(self.negateModel(model)))
+        solver.pop()
+
+        if cands == []:
+            return [(None, None, None)]
+        return cands
+
+    """ searches for the smallest program: for nc = base, base + 1, ... tries nc
+        clauses of nl = 1, 2, ... literals, and for each size grows the bound up to
+        maxBound, reusing the frames built so far and the candidates
+        refuted at smaller bounds """
+
+    def autoSynthesize(self, maxNc, maxNl, maxBound):
+        # the first base clauses are base cases (getShape), so programs
+        # have at least that many clauses
+        with self.verifiers():
+            for nc in range(max(1, self.base), maxNc + 1):
+                for nl in range(1, maxNl + 1):
+                    log.info("Trying nc = %s nl = %s", nc, nl)
+                    res = self.deepen(nc, nl, maxBound)
+                    if res != False:
+                        return res
+
+        log.info("no solution exists")
+        return False
+
+    """ iterative deepening over the bound for programs of nc clauses
+        of nl literals """
+
+    def deepen(self, nc, nl, maxBound):
+        with self.prof.phase("vars"):
+            (headsConst, bodiesConst, arityConsts, argsConst) = self.createVars(nc, nl)
+
+        with self.prof.phase("simulation"):
+            initConsts = self.initSimulation()
+
+        with self.prof.phase("shape"):
+            (chain, base, nonbase, equality) = self.getShape()
+
+        with self.prof.phase("soft"):
+            softC = self.getObjective()
+
+        # frames, and candidates refuted at smaller bounds, stay asserted;
+        # the examples of bound k are only assumed while checking k
+        const = And(headsConst, bodiesConst, arityConsts, argsConst, chain, base, nonbase, initConsts, equality)
+        acts = []
+        if self.explain:
+            (const, acts) = self.nameGroups(
+                [("heads", headsConst), ("bodies", bodiesConst),
+                 ("arity", arityConsts), ("args", argsConst),
+                 ("chain", chain), ("base", base), ("nonbase", nonbase),
+                 ("init", initConsts), ("shape", equality)])
+        solver = self.mkSolver(const, [], softC)
+
+        # nothing of this size satisfies the clause shape constraints
+        self.core = None
+        (clauses, model) = self.checkSolver(solver, acts)
+        if clauses is None:
+            if self.core is not None:
+                log.info("unsat core: %s", ", ".join(self.coreNames()))
+            return False
+
+        for k in range(1, maxBound + 1):
+            self.bound = k
+            with self.prof.phase("simulation"):
+                frame = self.addFrame(k)
+            solver.add(frame)
+
+            # the derivation symmetry of frames k-1 and k
+            if k > 1:
+                solver.add(self.getFrameOrder(k - 1))
+
+            # each clause is applied in some frame
+            if k < nc:
+                continue
 
-                print negModel
-                const = And(const, negModel)
+            log.info("Trying bound %s", k)
+            (pos, neg) = self.getCorrectness(k)
+            act = Bool("bound" + str(k))
+            if self.explain:
+                # the positive examples of bound k get an assumption each
+                (named, posActs) = self.nameGroups(
+                    [("pos:" + str(p) + "@" + str(k), c) for (p, c) in zip(self.pfacts, pos)])
+                solver.add(Implies(act, And(And(*neg), self.getApplyAll(k))))
+                solver.add(named)
+                boundActs = [act] + posActs
+            else:
+                solver.add(Implies(act, And(And(*pos), And(*neg), self.getApplyAll(k))))
+                boundActs = [act]
+
+            self.core = None
+            res = self.cegis(const, pos, softC, solver, acts + boundActs)
+            if res != False:
+                return res
+            if self.core is not None:
+                log.info("unsat core: %s", ", ".join(self.coreNames()))
+
+            # unsat without the examples of bound k: more frames only
+            # add constraints, so no larger bound can succeed either
+            if self.core is not None and not any(c.eq(a) for c in self.core for a in boundActs):
+                log.info("no solution for any bound")
+                return False
 
-            i = i + 1
+        return False
 
 
 # rin = Relation("E", 2)
@@ -1274,7 +2497,10 @@ class STask:
 # input = [Fact(red, 1, 2), Fact(red, 2, 3), Fact(blue, 3, 4), Fact(blue, 4,5)]
 #
 # pe = [Fact(ored, 1,2), Fact(ored,2,3), Fact(ored, 1, 3), Fact(oblue, 3,4), Fact(oblue, 3, 5), Fact(oblue, 4,5) ]
-# ne = [Fact(ored, 1, 5), Fact(ored, 3,1), Fact(ored, 2, 2), Fact(ored, 4,3), Fact(ored, 3,4),  Fact(ored, 2,1), Fact(oblue, 1,2), Fact(oblue,2,3), Fact(ored,4,5), Fact(ored, 1, 1), Fact(oblue, 1, 1), Fact(oblue, 5,3), Fact(oblue, 1,5), Fact(oblue, 1,3), Fact(oblue, 4,3), Fact(oblue, 5,3)]
+# ne = [Fact(ored, 1, 5), Fact(ored, 3,1), Fact(ored, 2, 2), Fact(ored, 4,3),
+#       Fact(ored, 3,4),  Fact(ored, 2,1), Fact(oblue, 1,2), Fact(oblue,2,3),
+#       Fact(ored,4,5), Fact(ored, 1, 1), Fact(oblue, 1, 1), Fact(oblue, 5,3),
+#       Fact(oblue, 1,5), Fact(oblue, 1,3), Fact(oblue, 4,3), Fact(oblue, 5,3)]
 #
 # x = EDB([ blue, red], input)
 # s = STask(x, [oblue, ored], pe, ne, domain=6)
@@ -0,0 +1,104 @@
+""" Task files: one synthesis task per line as a JSON object, e.g.
+
+    {"name": "TC", "edb": [["E", 2]], "idb": [["T", 2]],
+     "facts": [["E", 1, 2], ["E", 2, 3]], "pos": [["T", 1, 3]], "neg": [],
+     "domain": 5, "options": {"base": 1},
+     "synthesize": {"nc": 2, "nl": 2, "bound": 4}}
+
+    edb, idb: relations as [name, arity], in the order they are numbered
+        in the encoding
+    facts, pos, neg: EDB facts and positive/negative examples as
+        [relation name, constant, ...]
+    domain: maximum integer that can appear (exclusive)
+    options: keyword arguments of STask
+    synthesize: arguments of STask.synthesize
+    edbFiles (optional): EDB relation name -> delimited file (or list of
+        files) of its tuples, relative to the working directory, loaded
+        into a columnar EDB (see columnar.py) along with facts. The
+        constants of the files, facts, pos and neg are then symbols,
+        numbered in the order they are first seen, and domain may be
+        left out to cover exactly these
+
+    Blank lines and lines starting with # are ignored.
+"""
+
+import json
+
+from silp import *
+from columnar import SymbolTable, loadEdb
+
+
+""" yields the task specs in path one at a time """
+
+
+def loadTasks(path):
+    with open(path) as f:
+        for n, line in enumerate(f):
+            line = line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+
+            try:
+                yield json.loads(line)
+            except ValueError as e:
+                raise ValueError("%s:%d: %s" % (path, n + 1, e))
+
+
+def findTask(path, name):
+    for spec in loadTasks(path):
+        if spec["name"] == name:
+            return spec
+    return None
+
+
+""" builds the STask of spec; options override the ones in the file.
+    Returns the task and the arguments of its synthesize call """
+
+
+def makeTask(spec, **options):
+    rels = {}
+
+    def mkRels(l):
+        res = []
+        for (name, arity) in l:
+            assert(name not in rels)
+            rels[name] = Relation(str(name), arity)
+            res.append(rels[name])
+        return res
+
+    symbols = None
+
+    def mkFacts(l):
+        if symbols is not None:
+            l = map(lambda f: [f[0]] + map(symbols.intern, f[1:]), l)
+        return map(lambda f: Fact(rels[f[0]], *f[1:]), l)
+
+    irels = mkRels(spec["edb"])
+    orels = mkRels(spec["idb"])
+
+    domain = spec.get("domain")
+    if "edbFiles" in spec:
+        symbols = SymbolTable()
+        edb = loadEdb(irels, spec["edbFiles"], spec.get("facts", []), symbols)
+    else:
+        edb = EDB(irels, mkFacts(spec["facts"]))
+
+    pos = mkFacts(spec["pos"])
+    neg = mkFacts(spec["neg"])
+
+    if symbols is not None:
+        if domain is None:
+            domain = len(symbols) + 1
+        if domain <= len(symbols):
+            raise ValueError("%s: domain %d does not cover %d symbols" %
+                             (spec["name"], domain, len(symbols)))
+
+    opts = dict(spec.get("options", {}))
+    opts.update(options)
+    opts = dict(map(lambda (k, v): (str(k), v), opts.items()))
+
+    task = STask(edb, orels, pos, neg, domain, **opts)
+
+    params = dict(map(lambda (k, v): (str(k), v), spec["synthesize"].items()))
+
+    return (task, params)
@@ -0,0 +1,99 @@
+from contextlib import contextmanager
+from timeit import default_timer as timer
+import json
+
+from z3 import *
+
+
+class Profile:
+    """ Timings and counters of one synthesis run; consists of
+        times: phase name -> accumulated wall time
+        counts: counter name -> value
+        checks: per solver check, its time and z3 statistics (None
+            unless the task profiles)
+        iterations: per CEGIS iteration, the time spent in each phase
+    """
+
+    def __init__(self):
+        self.times = {}
+        self.counts = {}
+        self.checks = []
+        self.iterations = []
+
+    @contextmanager
+    def phase(self, name):
+        start = timer()
+        try:
+            yield
+        finally:
+            self.add(name, timer() - start)
+
+    def add(self, name, t):
+        self.times[name] = self.times.get(name, 0) + t
+
+    def time(self, name):
+        return self.times.get(name, 0)
+
+    def count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def set(self, name, n):
+        self.counts[name] = n
+
+    def check(self, t, res, stats):
+        self.checks.append({"time": t, "result": str(res), "stats": stats})
+
+    def iteration(self, i, times):
+        r = dict(times)
+        r["iteration"] = i
+        self.iterations.append(r)
+
+    def toDict(self):
+        return {"times": self.times, "counts": self.counts,
+                "checks": self.checks, "iterations": self.iterations}
+
+    def dump(self, path, **extra):
+        r = self.toDict()
+        r.update(extra)
+        f = open(path, "a")
+        f.write(json.dumps(r) + "\n")
+        f.close()
+
+
+""" number of distinct AST nodes in the DAG of e """
+
+
+def astSize(e):
+    seen = set()
+    todo = [e]
+    while todo != []:
+        n = todo.pop()
+        i = n.get_id()
+        if i in seen:
+            continue
+        seen.add(i)
+        if is_app(n):
+            todo.extend(n.children())
+        elif is_quantifier(n):
+            todo.append(n.body())
+    return len(seen)
+
+
+""" number of top-level conjuncts of e """
+
+
+def numConjuncts(e):
+    n = 0
+    todo = [e]
+    while todo != []:
+        c = todo.pop()
+        if is_and(c):
+            todo.extend(c.children())
+        elif not is_true(c):
+            n = n + 1
+    return n
+
+
+def z3Stats(s):
+    st = s.statistics()
+    return dict(map(lambda k: (k, st.get_key_value(k)), st.keys()))